@@ -1,191 +1,203 @@
 import importlib
 import time
+import resource
 import random
 import re
 import asyncio
+import secrets
+import signal
 from html import escape 
-from flask import Flask
-import threading
+
+# Taken before the heavy imports below so the ready log covers the whole startup
+BOOT_STARTED = time.monotonic()
 
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
 from telegram import InlineKeyboardMarkup, InlineKeyboardButton
 from telegram import Update, MessageEntity
 
-from telegram.ext import CommandHandler, CallbackContext, MessageHandler, filters
+from telegram.ext import CommandHandler, CallbackContext, MessageHandler, TypeHandler, filters
 
-from shivu import collection, top_global_groups_collection, group_user_totals_collection, user_collection, user_totals_collection, shivuu
+from shivu import top_global_groups_collection, group_user_totals_collection, user_collection
 from shivu import application, SUPPORT_CHAT, UPDATE_CHAT, db, LOGGER
+from shivu import WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_SECRET, WEBHOOK_MAX_CONNECTIONS
+from shivu.catalog import catalog, migrate_taxonomy
+from shivu.drops import chat_states, claim_drop, drop_queue, throttle_rejection, DROP_LOGGER
+from shivu.health import HealthServer
+from shivu.indexes import ensure_indexes
+from shivu.metrics import boot_timings, record_boot
+from shivu.outbound import PRIORITY_HIGH
+from shivu.ownership import grant_characters, load_user, owned_counts, ownership_migration, resolve
+from shivu.scheduler import unscheduled
+from shivu.spamguard import spam_guard
+from shivu.taxonomy import (
+    COMMON, RARE, EXTREME, SPARKING, LIMITED_EDITION, ULTIMATE, SUPREME, CELESTIAL, category_label, rarity_label
+)
+from shivu.webhook import WebhookReceiver
 from shivu.modules import ALL_MODULES
 
-
-
-app = Flask(__name__)
-
-@app.route('/')
-def health_check():
-    return "OK", 200
-
-def run_health_check():
-    app.run(host="0.0.0.0", port=8000, debug=False, use_reloader=False)
-
-if __name__ == "__main__":
-    # Start Flask health check in a separate thread
-    threading.Thread(target=run_health_check, daemon=True).start()
-
-   
-locks = {}
-message_counters = {}
-spam_counters = {}
-last_characters = {}
-sent_characters = {}
-first_correct_guesses = {}
-message_counts = {}
+# Webhook requests must carry a secret token; without a configured one each run uses a random one
+webhook_secret = WEBHOOK_SECRET or secrets.token_urlsafe(32)
 
 
 for module_name in ALL_MODULES:
     imported_module = importlib.import_module("shivu.modules." + module_name)
 
 
-last_user = {}
-warned_users = {}
 def escape_markdown(text):
     escape_chars = r'\*_`\\~>#+-=|{}.!'
     return re.sub(r'([%s])' % re.escape(escape_chars), r'\\\1', text)
 
 
 
-import asyncio
-
-# Lock system to prevent race conditions in high-traffic groups
-locks = {}
-
-
+# ✅ Counting never waits for a handler slot: it only touches memory and hands drops to the workers
+@unscheduled
 async def message_counter(update: Update, context: CallbackContext) -> None:
-    chat_id = str(update.effective_chat.id)
+    chat_id = update.effective_chat.id
     user_id = update.effective_user.id
 
     if not user_id:  
         return  # Ignore system messages
 
-    if chat_id not in locks:
-        locks[chat_id] = asyncio.Lock()
-    lock = locks[chat_id]
-
-    async with lock:
-        # ✅ Fetch latest droptime from MongoDB
-        chat_data = await user_totals_collection.find_one({'chat_id': chat_id})
-        message_frequency = chat_data.get("message_frequency", 100) if chat_data else 100
-
-        # ✅ Initialize message count if missing
-        if chat_id not in message_counts:
-            message_counts[chat_id] = 0
-
-        # ✅ Check if the message contains valid content (countable messages)
-        message = update.effective_message
-        if message:
-            if (
-                message.text  # Regular text messages (including emoji-only messages)
-                or message.sticker  # Stickers
-                or message.animation  # GIFs
-                or message.photo  # Images
-                or message.video  # Videos
-                or message.document  # Files like PDFs
-                or message.audio  # Audio files
-                or message.voice  # Voice messages
-                or message.video_note  # Video notes
-                or message.entities  # Entities like mentions, hashtags, etc.
-            ):
-                message_counts[chat_id] += 1  # ✅ Count all messages
-
-        # ✅ Debugging Log
-        print(f"🔍 [DEBUG] Group: {chat_id} | Messages: {message_counts.get(chat_id, 0)} | Drop at: {message_frequency}")
-
-        # ✅ Drop Character if Message Count Reached
-        if message_counts[chat_id] >= message_frequency:
-            print(f"🟢 [DEBUG] Triggering send_image() in {chat_id}")
-            await send_image(update, context)  # Call send_image properly
-            message_counts[chat_id] = 0  # Reset counter
-
-RESTRICTED_RARITIES = ["🔱 Ultimate","👑 Supreme", "🔮 Limited Edition", "⛩️ Celestial"]
-
-async def send_image(update: Update, context: CallbackContext) -> None:
-    """Drops a character when the message frequency is reached."""
-    chat_id = update.effective_chat.id
-
-    # ✅ Fetch all characters (excluding restricted rarities)
-    all_characters = list(await collection.find({"rarity": {"$nin": RESTRICTED_RARITIES}}).to_list(length=None))
-
-    if not all_characters:
-        print(f"❌ [DEBUG] No valid characters found for dropping in {chat_id}!")
+    # ✅ Per-chat state (counter, droptime, drop state) lives in the bounded chat store;
+    # Mongo is only read when the chat is not in memory
+    state = chat_states.get(chat_id) or await chat_states.load(chat_id)
+
+    # ✅ Check if the message contains valid content (countable messages)
+    message = update.effective_message
+    if message:
+        if (
+            message.text  # Regular text messages (including emoji-only messages)
+            or message.sticker  # Stickers
+            or message.animation  # GIFs
+            or message.photo  # Images
+            or message.video  # Videos
+            or message.document  # Files like PDFs
+            or message.audio  # Audio files
+            or message.voice  # Voice messages
+            or message.video_note  # Video notes
+            or message.entities  # Entities like mentions, hashtags, etc.
+        ):
+            state.message_count += 1  # ✅ Count all messages (no await in between, so no lock needed)
+            chat_states.mark_dirty(chat_id)
+
+    # ✅ Debugging Log
+    DROP_LOGGER.debug("Group: %s | Messages: %s | Drop at: %s", chat_id, state.message_count, state.droptime)
+
+    # ✅ Drop Character if Message Count Reached: hand it to the drop workers
+    if state.message_count >= state.droptime and drop_queue.enqueue(chat_id, state):
+        DROP_LOGGER.debug("Queued send_image() in %s", chat_id)
+        state.message_count = 0  # Reset counter
+
+async def send_image(bot, chat_id) -> None:
+    """Drops a character when the message frequency is reached (runs on a drop worker)."""
+
+    # ✅ Next character from this chat's no-repeat deck over the in-memory drop pool
+    await catalog.ensure_fresh()
+    state = await chat_states.load(chat_id)
+
+    character = state.deck.draw(catalog)
+    if character is None:
+        DROP_LOGGER.warning("No valid characters found for dropping in %s!", chat_id)
         return  # No valid characters available
 
-    # ✅ Prevent duplicate character drops
-    if chat_id not in sent_characters:
-        sent_characters[chat_id] = []
-
-    available_characters = [c for c in all_characters if c['id'] not in sent_characters[chat_id]]
-
-    if not available_characters:
-        sent_characters[chat_id] = []  # Reset tracking
-        available_characters = all_characters  # Refill with all valid characters
-
-    # ✅ Select a **random character**
-    character = random.choice(available_characters)
-    sent_characters[chat_id].append(character['id'])
-    last_characters[chat_id] = character
+    state.new_drop(character)
+    chat_states.mark_dirty(chat_id)
 
     # ✅ Use **file_id** instead of image URL
     file_id = character.get('file_id', None)
     if not file_id:
-        print(f"❌ [DEBUG] Missing `file_id` for {character['name']} | Skipping drop...")
+        DROP_LOGGER.warning("Missing file_id for %s | Skipping drop...", character['name'])
         return  # Skip if no file_id is present
 
     # ✅ Drop the character
-    await context.bot.send_photo(
+    await bot.send_photo(
         chat_id=chat_id,
         photo=file_id,
         caption=(
             "🔥 A Character Has Appeared!🔥\n\n" 
  "⚡ Be the first to /collect them!"),
-        parse_mode='Markdown'
+        parse_mode='Markdown',
+        rate_limit_args=PRIORITY_HIGH
     )
 
-    print(f"✅ [DEBUG] Character Dropped in {chat_id}: {character['name']}")
+    DROP_LOGGER.info("Character Dropped in %s: %s", chat_id, character['name'])
+    if "first_drop" not in boot_timings:
+        LOGGER.info("First drop %.2fs after boot", record_boot("first_drop", BOOT_STARTED))
             
 
 # Define rewards based on rarity
 REWARD_TABLE = {
-    "⛔ Common": (100, 150, 1, 3),
-    "🍀 Rare": (200, 350, 3, 7),
-    "🟣 Extreme": (300, 450, 5, 10),
-    "🟡 Sparking": (400, 600, 7, 12),
-    "🔮 Limited Edition": (500, 800, 10, 15),
-    "🔱 Ultimate": (750, 1200, 15, 20),
-    "👑 Supreme": (800, 1300, 20, 25),
-    "⛩️ Celestial": (1000, 1500, 25, 30)
+    COMMON: (100, 150, 1, 3),
+    RARE: (200, 350, 3, 7),
+    EXTREME: (300, 450, 5, 10),
+    SPARKING: (400, 600, 7, 12),
+    LIMITED_EDITION: (500, 800, 10, 15),
+    ULTIMATE: (750, 1200, 15, 20),
+    SUPREME: (800, 1300, 20, 25),
+    CELESTIAL: (1000, 1500, 25, 30)
 }
 
 
+async def grant_guess_reward(user, chat_id, character, coins, chrono_crystals) -> None:
+    """Adds the guessed character (by id, see shivu/ownership.py) and rewards to the user and bumps group stats.
+
+    The user document is created or updated by a single upserted update_one; the two
+    group-stat upserts are sent concurrently with it.
+    """
+    profile = {'first_name': user.first_name}
+    user_update = {
+        '$set': profile,
+        '$inc': {'coins': coins, 'chrono_crystals': chrono_crystals},
+    }
+    if user.username:
+        profile['username'] = user.username
+    else:
+        user_update['$setOnInsert'] = {'username': None}
+
+    await asyncio.gather(
+        grant_characters(user.id, [character['id']], user_update, upsert=True),
+        group_user_totals_collection.update_one(
+            {'user_id': user.id, 'group_id': chat_id},
+            {'$inc': {'count': 1}},
+            upsert=True
+        ),
+        top_global_groups_collection.update_one(
+            {'group_id': chat_id},
+            {'$inc': {'count': 1}},
+            upsert=True
+        ),
+    )
+
+
+async def reply_rejected(update: Update, state, text) -> None:
+    """Replies to a wrong/late guess, at most once per GUESS_REPLY_WINDOW per chat."""
+    suppressed = throttle_rejection(state)
+    if suppressed is None:
+        return
+    if suppressed:
+        text += f"\n({suppressed} more wrong or late guesses since the last reply)"
+    await update.message.reply_text(text)
+
+
 async def guess(update: Update, context: CallbackContext) -> None:
     chat_id = update.effective_chat.id
     user_id = update.effective_user.id
 
     # ✅ Check if a character has been dropped
-    if chat_id not in last_characters:
+    state = await chat_states.load(chat_id)
+    if state.last_character is None:
         await update.message.reply_text("❌ No character has been dropped yet!")
         return
 
-    dropped_character = last_characters[chat_id]
-    character_name = dropped_character["name"].lower()
-    character_rarity = dropped_character.get("rarity", "Common")
+    dropped_character = state.last_character
+    character_rarity = dropped_character.get("rarity")
 
-    # ✅ Reset tracking when a new character appears
-    if chat_id not in first_correct_guesses or first_correct_guesses[chat_id] != dropped_character['id']:
-        first_correct_guesses[chat_id] = None  
+    # ✅ Remember which drop this guess is for; a newer drop gets a new token
+    drop_token = state.drop_token
 
     # ✅ Check if the character has already been guessed
-    if first_correct_guesses[chat_id] is not None:
-        await update.message.reply_text("❌ This character has already been guessed!")
+    if state.drop_winner is not None:
+        await reply_rejected(update, state, "❌ This character has already been guessed!")
         return
 
     # ✅ Extract user's guess
@@ -198,10 +210,12 @@ async def guess(update: Update, context: CallbackContext) -> None:
         await update.message.reply_text("❌ Invalid characters in guess.")
         return
 
-    # ✅ Check if the guessed name matches
-    name_parts = character_name.split()
-    if sorted(name_parts) == sorted(guess_text.split()) or any(part == guess_text for part in name_parts):
-        first_correct_guesses[chat_id] = dropped_character['id']  # ✅ Mark character as guessed
+    # ✅ Check if the guessed name matches (precomputed name tokens and aliases)
+    if catalog.matcher(dropped_character).matches(guess_text):
+        # ✅ Exactly one correct guess wins this drop
+        if not await claim_drop(chat_id, state, drop_token, user_id):
+            await reply_rejected(update, state, "❌ This character has already been guessed!")
+            return
 
         # ✅ Assign rewards based on rarity
         if character_rarity in REWARD_TABLE:
@@ -212,60 +226,29 @@ async def guess(update: Update, context: CallbackContext) -> None:
             coins_won = random.randint(100, 200)  # Default fallback
             chrono_crystals_won = random.randint(1, 5)
 
-        # ✅ Update user collection
-        user = await user_collection.find_one({'id': user_id})
-        if user:
-            update_fields = {}
-            if update.effective_user.username and update.effective_user.username != user.get('username'):
-                update_fields['username'] = update.effective_user.username
-            if update.effective_user.first_name != user.get('first_name'):
-                update_fields['first_name'] = update.effective_user.first_name
-            if update_fields:
-                await user_collection.update_one({'id': user_id}, {'$set': update_fields})
-
-            await user_collection.update_one({'id': user_id}, {'$push': {'characters': dropped_character}})
-            await user_collection.update_one({'id': user_id}, {'$inc': {'coins': coins_won, 'chrono_crystals': chrono_crystals_won}})
-        else:
-            await user_collection.insert_one({
-                'id': user_id,
-                'username': update.effective_user.username,
-                'first_name': update.effective_user.first_name,
-                'characters': [dropped_character],
-                'coins': coins_won,
-                'chrono_crystals': chrono_crystals_won
-            })
-
-        # ✅ Update group user stats
-        await group_user_totals_collection.update_one(
-            {'user_id': user_id, 'group_id': chat_id},
-            {'$inc': {'count': 1}},
-            upsert=True
-        )
-
-        # ✅ Update top global groups
-        await top_global_groups_collection.update_one(
-            {'group_id': chat_id},
-            {'$inc': {'count': 1}},
-            upsert=True
-        )
+        # ✅ Grant the character, rewards and stats in one round trip
+        await grant_guess_reward(update.effective_user, chat_id, dropped_character, coins_won, chrono_crystals_won)
 
         # ✅ Send success message
         keyboard = [[InlineKeyboardButton("See Collection", switch_inline_query_current_chat=f"collection.{user_id}")]]
-        await update.message.reply_text(
+        await context.bot.send_message(
+            chat_id,
             f'<b><a href="tg://user?id={user_id}">{escape(update.effective_user.first_name)}</a></b> You guessed a new character! ✅️\n\n'
             f'🆔 <b>Name:</b> {dropped_character["name"]}\n'
-            f'🔹 <b>Category:</b> {dropped_character["category"]}\n'
-            f'🎖 <b>Rarity:</b> {dropped_character["rarity"]}\n\n'
+            f'🔹 <b>Category:</b> {category_label(dropped_character.get("category"))}\n'
+            f'🎖 <b>Rarity:</b> {rarity_label(character_rarity)}\n\n'
             f'🏆 <b>Rewards:</b>\n'
             f'💰 <b>Zeni:</b> {coins_won}\n'
             f'💎 <b>Chrono Crystals:</b> {chrono_crystals_won}\n\n'
             f'This character has been added to your collection. Use /collection to see your collection!',
             parse_mode='HTML',
-            reply_markup=InlineKeyboardMarkup(keyboard)
+            reply_markup=InlineKeyboardMarkup(keyboard),
+            reply_to_message_id=update.message.message_id,
+            rate_limit_args=PRIORITY_HIGH
         )
 
     else:
-        await update.message.reply_text("❌ Incorrect character name. Try again!")
+        await reply_rejected(update, state, "❌ Incorrect character name. Try again!")
 
 
   
@@ -281,13 +264,14 @@ async def fav(update: Update, context: CallbackContext) -> None:
     character_id = context.args[0]
 
     
-    user = await user_collection.find_one({'id': user_id})
+    user = await load_user(user_id, {'favorites': 1})
     if not user:
         await update.message.reply_text('You have not Guessed any characters yet....')
         return
 
 
-    character = next((c for c in user['characters'] if c['id'] == character_id), None)
+    await catalog.ensure_fresh()
+    character = resolve(character_id, user) if owned_counts(user).get(character_id) else None
     if not character:
         await update.message.reply_text('This Character is Not In your collection')
         return
@@ -303,22 +287,86 @@ async def fav(update: Update, context: CallbackContext) -> None:
 
 
 
+health_server = None
+
+
+async def post_init(application) -> None:
+    """Starts background workers and the health server once the bot is initialized."""
+    global health_server
+    await ensure_indexes()
+    await migrate_taxonomy()
+    await catalog.ensure_fresh()
+    record_boot("catalog", BOOT_STARTED)
+    drop_queue.start(application.bot, send_image)
+    chat_states.start()
+    ownership_migration.start()
+    health_server = HealthServer(application)
+    if WEBHOOK_URL:
+        health_server.add_webhook(WEBHOOK_PATH, WebhookReceiver(application, webhook_secret))
+    await health_server.start()
+    LOGGER.info(
+        "Bot ready in %.2fs, max RSS %.1f MiB",
+        record_boot("ready", BOOT_STARTED),
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    )
+
+
+async def post_shutdown(application) -> None:
+    await health_server.stop()
+    await drop_queue.stop()
+    await chat_states.stop()
+    await ownership_migration.stop()
+
+
 def main() -> None:
     """Run bot."""
 
+    # Per-user command limits run before every other handler
+    application.add_handler(TypeHandler(Update, spam_guard), group=-1)
+
     # Add command handlers
     application.add_handler(CommandHandler(["guess", "protecc", "collect", "grab", "hunt"], guess, block=False))
     application.add_handler(CommandHandler("fav", fav, block=False))
     application.add_handler(MessageHandler(filters.ALL & ~filters.COMMAND, message_counter, block=False))
     
 
-    # Start polling for Telegram bot commands
-    application.run_polling(drop_pending_updates=True)
+    application.post_init = post_init
+    application.post_shutdown = post_shutdown
 
-if __name__ == "__main__":
-    LOGGER.info("Starting Pyrogram Client...")
-    shivuu.start()  # Ensure Pyrogram client starts correctly
-    LOGGER.info("Pyrogram Client started successfully!")
+    if WEBHOOK_URL:
+        # Receive updates through the webhook route on the health server
+        asyncio.run(run_webhook())
+    else:
+        # Start polling for Telegram bot commands
+        application.run_polling(drop_pending_updates=True)
+
+
+async def run_webhook() -> None:
+    """Webhook counterpart of run_polling: same lifecycle hooks, updates arrive over HTTP."""
+    await application.initialize()
+    await post_init(application)
+    await application.bot.set_webhook(
+        url=WEBHOOK_URL,
+        secret_token=webhook_secret,
+        max_connections=WEBHOOK_MAX_CONNECTIONS,
+        allowed_updates=Update.ALL_TYPES,
+        drop_pending_updates=True
+    )
+    await application.start()
+    LOGGER.info("Receiving updates via webhook at %s", WEBHOOK_URL)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    try:
+        await stop.wait()
+    finally:
+        await application.stop()
+        await application.shutdown()
+        await post_shutdown(application)
 
+if __name__ == "__main__":
+    # ✅ Every handler runs on PTB; no Pyrogram client is started
     LOGGER.info("Starting Telegram Bot...")
-    main()  # Now start the Telegram bot
+    main()
@@ -1,22 +1,18 @@
+import asyncio
 import logging  
 import os
-from pyrogram import Client 
 from telegram.ext import Application
 from motor.motor_asyncio import AsyncIOMotorClient
 
-logging.basicConfig(
-    format="%(asctime)s - %(levelname)s - %(name)s - %(message)s",
-    handlers=[logging.FileHandler("log.txt"), logging.StreamHandler()],
-    level=logging.INFO,
-)
+from shivu.config import Development as Config
+from shivu.log import setup_logging
+from shivu.metrics import InstrumentedApplication
+from shivu.mongo_monitor import MongoMonitor
+from shivu.outbound import OutboundLimiter
 
-logging.getLogger("apscheduler").setLevel(logging.ERROR)
-logging.getLogger('httpx').setLevel(logging.WARNING)
-logging.getLogger("pyrate_limiter").setLevel(logging.ERROR)
+setup_logging(levels=Config.LOG_LEVELS, sampling=Config.LOG_SAMPLING)
 LOGGER = logging.getLogger(__name__)
 
-from shivu.config import Development as Config
-
 
 api_id = Config.api_id
 api_hash = Config.api_hash
@@ -31,10 +27,28 @@ BOT_USERNAME = Config.BOT_USERNAME
 sudo_users = Config.sudo_users
 OWNER_ID = Config.OWNER_ID 
 LOAN_CHANNEL_ID = Config.LOAN_CHANNEL_ID
+GUESS_REPLY_WINDOW = Config.GUESS_REPLY_WINDOW
+COMMAND_LIMITS = Config.COMMAND_LIMITS
+CATALOG_SNAPSHOT = Config.CATALOG_SNAPSHOT
+HEALTH_PORT = Config.HEALTH_PORT
+WEBHOOK_URL = Config.WEBHOOK_URL
+WEBHOOK_PATH = Config.WEBHOOK_PATH
+WEBHOOK_SECRET = Config.WEBHOOK_SECRET
+WEBHOOK_MAX_CONNECTIONS = Config.WEBHOOK_MAX_CONNECTIONS
 
-application = Application.builder().token(TOKEN).build()
-shivuu = Client("Shivu", api_id, api_hash, bot_token=TOKEN)
-lol = AsyncIOMotorClient(mongo_url, tls=True, tlsAllowInvalidCertificates=True)
+# Every handler registered on `application` is timed and counted (see shivu/metrics.py), and every
+# message it sends is paced by chat and priority (see shivu/outbound.py)
+application = (
+    Application.builder()
+    .token(TOKEN)
+    .application_class(InstrumentedApplication)
+    .update_queue(asyncio.Queue(Config.UPDATE_QUEUE_SIZE))
+    .rate_limiter(OutboundLimiter())
+    .build()
+)
+# Every Mongo command is attributed to the handler that issued it (see shivu/mongo_monitor.py)
+mongo_monitor = MongoMonitor()
+lol = AsyncIOMotorClient(mongo_url, tls=True, tlsAllowInvalidCertificates=True, event_listeners=[mongo_monitor])
 db = lol['Character_catcher']
 collection = db['anime_characters_lol']
 user_totals_collection = db['user_totals_lmaoooo']
@@ -0,0 +1,455 @@
+import asyncio
+import json
+import os
+import random
+import re
+import time
+import unicodedata
+
+from pymongo import ReturnDocument, UpdateOne
+
+from shivu import banners_collection, collection, db, CATALOG_SNAPSHOT, LOGGER
+from shivu.taxonomy import category_code, category_label, is_droppable, rarity_code
+
+# The catalog version stamp lives next to the character id sequence
+VERSION_KEY = "catalog_version"
+
+# How often (seconds) a process re-reads the stamp to notice edits made elsewhere
+VERSION_CHECK_INTERVAL = 60
+
+# Edits made elsewhere are fetched incrementally; a full reload still runs this often (seconds)
+# to pick up anything an incremental fetch raced past
+FULL_RELOAD_INTERVAL = 60 * 60
+
+# Every edit stamps the changed documents with the new version; deletions are recorded here
+deletions_collection = db['catalog_deletions']
+
+# Fields of a catalog document kept in memory (Mongo's _id and unknown fields are dropped)
+CHARACTER_FIELDS = (
+    "id", "name", "rarity", "category", "file_id", "img_url", "aliases", "exclusive", "message_id",
+    "in_store", "price", "stock", "catalog_rev",
+)
+
+
+_NON_WORD = re.compile(r"[^\w\s]")
+
+
+def fold_name(text):
+    """Lowercases, strips accents and punctuation, and splits a name into tokens."""
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return _NON_WORD.sub(" ", text).split()
+
+
+class GuessMatcher:
+    """Precomputed answers for one character.
+
+    A guess matches if its folded tokens equal the full name or an alias in any order, or if
+    it is a single token of the name (e.g. just "goku").
+    """
+
+    __slots__ = ("full_names", "parts")
+
+    def __init__(self, name, aliases=()):
+        name_tokens = fold_name(name)
+        self.parts = frozenset(name_tokens)
+        self.full_names = frozenset(
+            tuple(sorted(tokens)) for tokens in map(fold_name, [name, *aliases]) if tokens
+        )
+
+    def matches(self, guess):
+        tokens = fold_name(guess)
+        if not tokens:
+            return False
+        if len(tokens) == 1 and tokens[0] in self.parts:
+            return True
+        return tuple(sorted(tokens)) in self.full_names
+
+
+class Character:
+    """One catalog entry. Reads like the Mongo document it came from: c['name'], c.get('aliases').
+
+    Records are shared by every handler, so treat them as read-only.
+    """
+
+    __slots__ = CHARACTER_FIELDS
+
+    _fields = frozenset(CHARACTER_FIELDS)
+
+    def __init__(self, document):
+        for field in CHARACTER_FIELDS:
+            setattr(self, field, document.get(field))
+        # ✅ Documents not migrated yet still carry labels (see migrate_taxonomy)
+        self.rarity = rarity_code(self.rarity)
+        self.category = category_code(self.category)
+
+    def __getitem__(self, key):
+        value = getattr(self, key) if key in self._fields else None
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def get(self, key, default=None):
+        value = getattr(self, key) if key in self._fields else None
+        return default if value is None else value
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __repr__(self):
+        return f"<Character {self.id} {self.name!r}>"
+
+    def to_dict(self):
+        """Plain document, for embedding a copy in another collection (e.g. banners)."""
+        return {
+            field: value for field in CHARACTER_FIELDS
+            if field != "catalog_rev" and (value := getattr(self, field)) is not None
+        }
+
+
+def _write_snapshot(path, snapshot):
+    """Writes the snapshot next to `path` first, so a crash never leaves a half-written file."""
+    temporary = f"{path}.tmp"
+    with open(temporary, "w", encoding="utf-8") as f:
+        json.dump(snapshot, f, ensure_ascii=False, separators=(",", ":"), default=str)
+    os.replace(temporary, path)
+
+
+async def get_catalog_version():
+    """Returns the current catalog version stamp (0 if the catalog was never edited)."""
+    stamp = await db.sequences.find_one({'_id': VERSION_KEY})
+    return stamp['sequence_value'] if stamp else 0
+
+
+async def bump_catalog_version():
+    """Takes the next catalog version stamp. Prefer publish_characters / publish_deletions."""
+    stamp = await db.sequences.find_one_and_update(
+        {'_id': VERSION_KEY},
+        {'$inc': {'sequence_value': 1}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    return stamp['sequence_value']
+
+
+async def publish_characters(character_ids):
+    """Call after inserting or updating catalog documents: stamps them and updates this process."""
+    character_ids = list(character_ids)
+    if not character_ids:
+        return
+    await collection.update_many(
+        {'id': {'$in': character_ids}}, {'$set': {'catalog_rev': await bump_catalog_version()}}
+    )
+    documents = await collection.find({'id': {'$in': character_ids}}).to_list(length=None)
+    await _publish(documents, ())
+
+
+async def publish_deletions(character_ids):
+    """Call after deleting catalog documents: records the deletion and updates this process."""
+    character_ids = list(character_ids)
+    if not character_ids:
+        return
+    version = await bump_catalog_version()
+    await deletions_collection.bulk_write([
+        UpdateOne({'_id': character_id}, {'$set': {'rev': version}}, upsert=True) for character_id in character_ids
+    ])
+    await _publish((), character_ids)
+
+
+async def _publish(documents, deleted_ids):
+    """Moves the version stamp past a finished edit and brings this process up to it.
+
+    The stamp is bumped again only once the documents carry their revision, so a process that
+    read the first bump before the write landed sees the stamp move and re-reads from there.
+    """
+    version = await bump_catalog_version()
+    if catalog.version is None:
+        return
+    async with catalog._lock:
+        if version > catalog.version:
+            await catalog.refresh(version)  # edits published elsewhere since the last check
+        for character_id in deleted_ids:
+            catalog.discard(character_id)
+        for document in documents:
+            catalog.apply(document)
+        catalog.reindex()
+        await catalog.save_snapshot()
+
+
+async def migrate_taxonomy():
+    """Replaces rarity/category labels stored before the integer codes, in the catalog and banners.
+
+    Cheap once done: the queries only match documents that still hold a string and were not
+    already reported (labels that match no code are marked with `taxonomy_unknown` and kept).
+    """
+    legacy = {
+        '$or': [{'rarity': {'$type': 'string'}}, {'category': {'$type': 'string'}}],
+        'taxonomy_unknown': {'$exists': False},
+    }
+    operations = []
+    changed = []
+    for document in await collection.find(legacy, {'id': 1, 'rarity': 1, 'category': 1}).to_list(length=None):
+        codes = {'rarity': rarity_code(document.get('rarity')), 'category': category_code(document.get('category'))}
+        update = {field: code for field, code in codes.items() if isinstance(code, int)}
+        if any(isinstance(code, str) for code in codes.values()):
+            LOGGER.warning("Character %s has an unknown rarity/category: %s", document.get('id'), document)
+            update['taxonomy_unknown'] = True
+        operations.append(UpdateOne({'_id': document['_id']}, {'$set': update}))
+        if any(isinstance(document.get(field), str) and isinstance(code, int) for field, code in codes.items()):
+            changed.append(document.get('id'))
+    if operations:
+        await collection.bulk_write(operations, ordered=False)
+        await publish_characters(changed)
+
+    banner_legacy = {
+        '$or': [{'characters.rarity': {'$type': 'string'}}, {'characters.category': {'$type': 'string'}}],
+        'taxonomy_unknown': {'$exists': False},
+    }
+    banners = await banners_collection.find(banner_legacy, {'characters': 1}).to_list(length=None)
+    for banner in banners:
+        characters = [
+            {**character, 'rarity': rarity_code(character.get('rarity')), 'category': category_code(character.get('category'))}
+            for character in banner['characters']
+        ]
+        update = {'characters': characters}
+        if any(isinstance(c['rarity'], str) or isinstance(c['category'], str) for c in characters):
+            LOGGER.warning("Banner %s has characters with an unknown rarity/category", banner['_id'])
+            update['taxonomy_unknown'] = True
+        await banners_collection.update_one({'_id': banner['_id']}, {'$set': update})
+
+    if operations or banners:
+        LOGGER.info("Taxonomy migration: %d characters and %d banners now use codes", len(operations), len(banners))
+
+
+class Catalog:
+    """Process-wide copy of the character catalog, with the lookups handlers need.
+
+    Loaded once, then kept current by fetching only the documents stamped (and the deletions
+    recorded) after the version this process last saw. Edits made in this process are applied
+    immediately by publish_characters / publish_deletions.
+
+    Each load is also written to CATALOG_SNAPSHOT, one row per character, tagged with its
+    version; a restart reads the file and only fetches what changed after it from Mongo.
+    """
+
+    def __init__(self):
+        self.characters = {}       # id -> Character
+        self.ordered = []          # every Character, by id
+        self.by_rarity = {}        # rarity -> [Character], by id
+        self.by_category = {}      # category -> [Character], by id
+        self.in_store = []         # [Character] currently in the store
+        self.rarity_totals = {}    # rarity -> number of characters
+        self.category_totals = {}  # category -> number of characters
+
+        # Drops
+        self.eligible = []    # every id that can drop
+        self.slots = []       # slot -> id, append-only so per-chat decks stay valid across reloads
+        self.slot_of = {}     # id -> slot
+        self.eligible_slots = []
+        self._droppable = set()
+        self.matchers = {}    # id -> GuessMatcher for droppable characters
+
+        self.version = None
+        self.reloads = 0
+        self.incremental_reloads = 0
+        self.snapshot_path = CATALOG_SNAPSHOT
+        self.snapshot_version = None  # version of the catalog last read from or written to the file
+        self._snapshot_read = False
+        self._checked_at = 0.0
+        self._loaded_at = 0.0
+        self._lock = asyncio.Lock()
+
+    def __len__(self):
+        return len(self.characters)
+
+    def invalidate(self):
+        """Forces a full reload on the next `ensure_fresh()`."""
+        self.version = None
+
+    async def ensure_fresh(self):
+        """Loads the catalog if needed, or fetches what changed if the version stamp moved."""
+        if self.version is not None and time.monotonic() - self._checked_at < VERSION_CHECK_INTERVAL:
+            return
+
+        async with self._lock:
+            now = time.monotonic()
+            if self.version is not None and now - self._checked_at < VERSION_CHECK_INTERVAL:
+                return
+
+            if self.version is None and not self._snapshot_read:
+                self._snapshot_read = True
+                self.load_snapshot()
+
+            version = await get_catalog_version()
+            self._checked_at = time.monotonic()
+            if self.version is None or version < self.version or now - self._loaded_at >= FULL_RELOAD_INTERVAL:
+                await self.reload(version)
+            elif version != self.version:
+                await self.refresh(version)
+            else:
+                return
+            await self.save_snapshot()
+
+    async def reload(self, version):
+        """Replaces the whole catalog."""
+        documents = await collection.find({}).to_list(length=None)
+        self.characters = {}
+        for document in documents:
+            self.apply(document)
+        self.reindex()
+        self.version = version
+        self._loaded_at = time.monotonic()
+        self.reloads += 1
+        LOGGER.info("Catalog loaded: %d characters, %d droppable (v%s)", len(self.characters), len(self.eligible), version)
+
+    async def refresh(self, version):
+        """Applies the documents edited and deleted since the version this process has.
+
+        Revisions equal to that version are read again: an edit stamped with it may have been
+        written only after this process last refreshed (see `_publish`).
+        """
+        since = self.version
+        documents = await collection.find({'catalog_rev': {'$gte': since}}).to_list(length=None)
+        deletions = await deletions_collection.find({'rev': {'$gte': since}}).to_list(length=None)
+        for deletion in deletions:
+            self.discard(deletion['_id'])
+        for document in documents:
+            self.apply(document)
+        self.reindex()
+        self.version = version
+        self.incremental_reloads += 1
+        LOGGER.info("Catalog v%s -> v%s: %d changed, %d deleted", since, version, len(documents), len(deletions))
+
+    def load_snapshot(self):
+        """Fills the catalog from the snapshot file; False if there is none or it cannot be read."""
+        if not self.snapshot_path:
+            return False
+        started = time.monotonic()
+        try:
+            with open(self.snapshot_path, encoding="utf-8") as f:
+                snapshot = json.load(f)
+            fields = snapshot['fields']
+            if tuple(fields) != CHARACTER_FIELDS:
+                raise ValueError("written with other character fields")
+            documents = [dict(zip(fields, row)) for row in snapshot['rows']]
+            version = snapshot['version']
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            LOGGER.warning("Ignoring catalog snapshot %s: %s", self.snapshot_path, e)
+            return False
+
+        self.characters = {}
+        for document in documents:
+            self.apply(document)
+        self.reindex()
+        self.version = self.snapshot_version = version
+        self._loaded_at = time.monotonic()
+        LOGGER.info("Catalog snapshot v%s read: %d characters in %.3fs", version, len(self.characters), self._loaded_at - started)
+        return True
+
+    async def save_snapshot(self):
+        """Writes the catalog to the snapshot file if it changed since the last write."""
+        if not self.snapshot_path or self.version == self.snapshot_version:
+            return
+        snapshot = {
+            'version': self.version,
+            'fields': CHARACTER_FIELDS,
+            'rows': [[getattr(character, field) for field in CHARACTER_FIELDS] for character in self.ordered],
+        }
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, _write_snapshot, self.snapshot_path, snapshot)
+        except OSError as e:
+            LOGGER.warning("Could not write catalog snapshot %s: %s", self.snapshot_path, e)
+            return
+        self.snapshot_version = self.version
+
+    def apply(self, document):
+        """Inserts or replaces one character (call `reindex()` after a batch)."""
+        character_id = document.get('id')
+        if character_id:
+            self.characters[character_id] = Character(document)
+
+    def discard(self, character_id):
+        """Removes one character (call `reindex()` after a batch)."""
+        self.characters.pop(character_id, None)
+
+    def reindex(self):
+        """Rebuilds the secondary indexes and totals from `characters` (no Mongo access)."""
+        ordered = sorted(self.characters.values(), key=lambda c: c.id)
+        by_rarity = {}
+        by_category = {}
+        eligible = []
+        eligible_slots = []
+        matchers = {}
+        for character in ordered:
+            by_rarity.setdefault(character.rarity, []).append(character)
+            by_category.setdefault(character.category, []).append(character)
+
+            character_id = character.id
+            if character_id not in self.slot_of:
+                self.slot_of[character_id] = len(self.slots)
+                self.slots.append(character_id)
+            if not is_droppable(character.rarity):
+                continue
+            eligible.append(character_id)
+            eligible_slots.append(self.slot_of[character_id])
+            matchers[character_id] = GuessMatcher(character.name or '', character.aliases or ())
+
+        self.ordered = ordered
+        self.by_rarity = by_rarity
+        self.by_category = by_category
+        self.in_store = [character for character in ordered if character.in_store]
+        self.rarity_totals = {rarity: len(characters) for rarity, characters in by_rarity.items()}
+        self.category_totals = {category: len(characters) for category, characters in by_category.items()}
+        self.eligible = eligible
+        self.eligible_slots = eligible_slots
+        self._droppable = set(eligible)
+        self.matchers = matchers
+
+    def get(self, character_id):
+        return self.characters.get(character_id)
+
+    def totals(self, field):
+        """Characters per category or rarity code, recomputed on every catalog change."""
+        return {"category": self.category_totals, "rarity": self.rarity_totals}.get(field, {})
+
+    def with_rarity(self, rarity):
+        return self.by_rarity.get(rarity, [])
+
+    def in_category(self, category):
+        return self.by_category.get(category, [])
+
+    def search(self, pattern):
+        """Characters whose name or category matches a compiled regex."""
+        return [
+            character for character in self.ordered
+            if pattern.search(character.name or '') or pattern.search(category_label(character.category))
+        ]
+
+    def random(self):
+        """Any character, droppable or not; None if the catalog is empty."""
+        return random.choice(self.ordered) if self.ordered else None
+
+    def matcher(self, character):
+        """Returns the precomputed GuessMatcher for a dropped character."""
+        matcher = self.matchers.get(character['id'])
+        if matcher is None:
+            matcher = GuessMatcher(character.get('name', ''), character.get('aliases') or ())
+        return matcher
+
+    def slot_character(self, slot):
+        """Returns the character in `slot` if it can currently drop, else None."""
+        character_id = self.slots[slot]
+        if character_id not in self._droppable:
+            return None
+        return self.characters[character_id]
+
+    def pick(self):
+        """Returns a random droppable character, or None if nothing can drop."""
+        if not self.eligible:
+            return None
+        return self.characters[random.choice(self.eligible)]
+
+
+catalog = Catalog()
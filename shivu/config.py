@@ -15,6 +15,40 @@ class Config(object):
     api_id = 26626068
     api_hash = "bf423698bcbe33cfd58b11c78c42caa2"
     LOAN_CHANNEL_ID = "-1002366254495"
+
+    # Port of the health/metrics HTTP server (/healthz, /readyz, /metrics)
+    HEALTH_PORT = 8000
+
+    # Webhook mode: set WEBHOOK_URL (public https URL ending in WEBHOOK_PATH) to receive updates on
+    # the health server instead of long polling. Telegram sends WEBHOOK_SECRET in every request and
+    # requests without it are refused; if left empty, a random secret is generated on every start.
+    WEBHOOK_URL = ""
+    WEBHOOK_PATH = "/webhook"
+    WEBHOOK_SECRET = ""
+    WEBHOOK_MAX_CONNECTIONS = 40
+
+    # Updates waiting for dispatch; in webhook mode a full queue answers 503 so Telegram retries
+    UPDATE_QUEUE_SIZE = 1000
+
+    # Per-logger levels and DEBUG sampling rates, on top of the defaults in shivu/log.py
+    # e.g. LOG_LEVELS = {"shivu.drops": "DEBUG"} to see a sample of per-message drop logs
+    LOG_LEVELS = {}
+    LOG_SAMPLING = {}
+
+    # Seconds during which further wrong/late guesses in a group get no reply (0 = reply to all)
+    GUESS_REPLY_WINDOW = 10
+
+    # Per-user command limits by class (see shivu/spamguard.py): (burst, seconds to refill the burst)
+    COMMAND_LIMITS = {
+        "heavy": (5, 30),     # /harem, /powerlevel, /profile, leaderboards and their pages
+        "inline": (15, 30),   # inline queries (sent on every keystroke)
+        "guess": (10, 10),
+        "default": (20, 60),
+    }
+
+    # Local copy of the character catalog, read at startup so only the changes since it was
+    # written are fetched from Mongo ("" to always load the whole catalog)
+    CATALOG_SNAPSHOT = "catalog_snapshot.json"
     
 class Production(Config):
     LOGGER = True
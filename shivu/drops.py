@@ -0,0 +1,413 @@
+import asyncio
+import logging
+import random
+import secrets
+import time
+from array import array
+from datetime import datetime, timezone
+from collections import OrderedDict
+
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from shivu import db, user_totals_collection, GUESS_REPLY_WINDOW, LOGGER
+from shivu.catalog import catalog
+from shivu.metrics import instrument
+
+# Per-message drop logging goes here; DEBUG records are sampled (see shivu/log.py)
+DROP_LOGGER = logging.getLogger("shivu.drops")
+
+DEFAULT_DROPTIME = 100
+
+# Drop workers send drops queued by message_counter; a full queue skips the drop
+DROP_WORKERS = 4
+DROP_QUEUE_SIZE = 1000
+
+# Chat state store bounds: least recently active chats are evicted past MAX_CHATS,
+# and any chat idle for CHAT_IDLE_TTL seconds is evicted on the next access.
+MAX_CHATS = 20000
+CHAT_IDLE_TTL = 6 * 60 * 60
+
+# Set when several bot processes serve the same groups: claims are then also decided in Mongo
+# (claim documents expire through the TTL index in shivu/indexes.py). A claim is keyed on the
+# drop token of the process that sent the drop, so this guards one drop against being won twice,
+# not two processes against dropping in the same chat.
+SHARED_CLAIMS = False
+drop_claims_collection = db['drop_claims']
+
+# Seconds between write-behind flushes of per-chat drop state
+FLUSH_INTERVAL = 5
+
+
+class DropDeck:
+    """Per-chat shuffled order of drop pool slots, so a chat sees every character once per cycle.
+
+    Slots are stored as unsigned 32-bit ints (4 bytes per character per chat). Drawing pops
+    from the end, characters added to the pool mid-cycle are shuffled into the remaining
+    deck, and characters removed from the pool are skipped when they come up.
+    """
+
+    __slots__ = ("remaining", "synced")
+
+    def __init__(self):
+        self.remaining = array("I")
+        self.synced = 0  # number of pool slots this deck knows about
+
+    def draw(self, pool):
+        """Returns the next character for this chat, or None if nothing can drop."""
+        if not self.synced:
+            self._reshuffle(pool)
+        elif self.synced < len(pool.slots):
+            self._add_new(pool)
+
+        character = self._pop(pool)
+        if character is None:
+            # ✅ Cycle finished: start a new shuffled one
+            self._reshuffle(pool)
+            character = self._pop(pool)
+        return character
+
+    def _pop(self, pool):
+        remaining = self.remaining
+        while remaining:
+            character = pool.slot_character(remaining.pop())
+            if character is not None:
+                return character
+        return None
+
+    def _reshuffle(self, pool):
+        self.remaining = array("I", pool.eligible_slots)
+        random.shuffle(self.remaining)
+        self.synced = len(pool.slots)
+
+    def _add_new(self, pool):
+        remaining = self.remaining
+        for slot in range(self.synced, len(pool.slots)):
+            if pool.slot_character(slot) is not None:
+                remaining.insert(random.randint(0, len(remaining)), slot)
+        self.synced = len(pool.slots)
+
+
+class ChatState:
+    """Everything the drop path keeps in memory for one group."""
+
+    __slots__ = (
+        "droptime", "message_count", "drop_queued", "deck",
+        "last_character", "drop_token", "drop_winner", "reject_until", "rejects_suppressed", "last_seen",
+    )
+
+    def __init__(self, droptime=DEFAULT_DROPTIME):
+        self.droptime = droptime
+        self.message_count = 0
+        self.drop_queued = False
+        self.deck = DropDeck()
+        self.last_character = None
+        self.drop_token = None   # unique per drop, so a re-drop of the same character is a new claim
+        self.drop_winner = None
+        self.reject_until = 0.0
+        self.rejects_suppressed = 0
+        self.last_seen = time.monotonic()
+
+    def new_drop(self, character):
+        self.last_character = character
+        self.drop_token = secrets.token_hex(6)
+        self.drop_winner = None
+
+    def claim(self, token, user_id):
+        """Compare-and-set: makes `user_id` the winner of drop `token` if nobody has won it yet.
+
+        Runs without awaiting, so it is atomic on the event loop.
+        """
+        if self.drop_token != token or self.drop_winner is not None:
+            return False
+        self.drop_winner = user_id
+        return True
+
+    def spill_fields(self):
+        """Fields persisted to Mongo (the deck is simply reshuffled after a restart)."""
+        return {
+            'message_count': self.message_count,
+            'last_character_id': self.last_character['id'] if self.last_character else None,
+            'drop_token': self.drop_token,
+            'drop_winner': self.drop_winner,
+        }
+
+
+class ChatStateStore:
+    """LRU/TTL-bounded map of chat_id -> ChatState with write-behind persistence.
+
+    Callers mark a chat dirty after changing its drop state; `flush()` writes every dirty
+    chat (and every dirty chat evicted since the last flush) in one unordered bulk_write.
+    A miss reads the chat's user_totals document once, which carries both the droptime and
+    the last persisted drop state, so state survives restarts and evictions.
+    """
+
+    def __init__(self, maxsize=MAX_CHATS, ttl=CHAT_IDLE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._states = OrderedDict()
+        self._loading = {}
+        self._dirty = set()   # chat ids in memory with unsaved changes
+        self._evicted = {}    # chat_id -> spill_fields() of dirty chats evicted before a flush
+        self._in_flight = {}  # chat_id -> spill_fields() the running flush is writing
+        self._flusher = None
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._states)
+
+    def get(self, chat_id):
+        """Returns the cached state without touching Mongo (None if the chat is not in memory)."""
+        state = self._states.get(chat_id)
+        if state is not None:
+            self.hits += 1
+            state.last_seen = time.monotonic()
+            self._states.move_to_end(chat_id)
+        return state
+
+    async def load(self, chat_id):
+        """Returns the chat's state, restoring it from Mongo on a miss."""
+        state = self.get(chat_id)
+        if state is not None:
+            return state
+
+        # ✅ Concurrent misses for the same chat share one read
+        task = self._loading.get(chat_id)
+        if task is None:
+            task = self._loading[chat_id] = asyncio.ensure_future(self._restore(chat_id))
+            task.add_done_callback(lambda _: self._loading.pop(chat_id, None))
+        return await asyncio.shield(task)
+
+    def mark_dirty(self, chat_id):
+        self._dirty.add(chat_id)
+
+    @property
+    def pending_writes(self):
+        return len(self._dirty) + len(self._evicted)
+
+    async def _restore(self, chat_id):
+        self.misses += 1
+        # ✅ Unflushed state stays in _evicted until the chat is back in _states, so a flush
+        # during the reads below still writes it; state a running flush is writing may not be in
+        # Mongo yet, so it is taken from the flush and written again
+        spilled = self._evicted.get(chat_id) or self._in_flight.get(chat_id)
+        pending = spilled is not None
+        if pending:
+            chat_data = await user_totals_collection.find_one({'chat_id': str(chat_id)}, {'message_frequency': 1}) or {}
+        else:
+            chat_data = await user_totals_collection.find_one(
+                {'chat_id': str(chat_id)}, {'message_frequency': 1, 'drop_state': 1}
+            ) or {}
+            spilled = chat_data.get('drop_state')
+
+        state = ChatState(chat_data.get('message_frequency', DEFAULT_DROPTIME))
+        if spilled:
+            state.message_count = spilled.get('message_count', 0)
+            state.drop_token = spilled.get('drop_token')
+            state.drop_winner = spilled.get('drop_winner')
+            if spilled.get('last_character_id'):
+                await catalog.ensure_fresh()
+                state.last_character = catalog.get(spilled['last_character_id'])
+
+        self._states[chat_id] = state
+        if pending:
+            self._evicted.pop(chat_id, None)
+            self._dirty.add(chat_id)  # not flushed yet, keep it pending
+        self._evict()
+        return state
+
+    def _evict(self):
+        now = time.monotonic()
+        states = self._states
+        skipped = []
+        while states:
+            chat_id, state = next(iter(states.items()))
+            if len(states) <= self.maxsize and now - state.last_seen < self.ttl:
+                break
+            states.popitem(last=False)
+            if state.drop_queued:
+                skipped.append((chat_id, state))  # a drop worker still needs it
+                continue
+            if chat_id in self._dirty:
+                self._dirty.discard(chat_id)
+                self._evicted[chat_id] = state.spill_fields()
+        for chat_id, state in skipped:
+            states[chat_id] = state
+
+    async def flush(self):
+        """Writes all pending drop state in one bulk_write."""
+        pending = self._evicted
+        self._evicted = {}
+        for chat_id in self._dirty:
+            state = self._states.get(chat_id)
+            if state is not None:
+                pending[chat_id] = state.spill_fields()
+        self._dirty = set()
+        if not pending:
+            return
+        self._in_flight = pending
+
+        operations = [
+            UpdateOne({'chat_id': str(chat_id)}, {'$set': {'drop_state': fields}}, upsert=True)
+            for chat_id, fields in pending.items()
+        ]
+        try:
+            await user_totals_collection.bulk_write(operations, ordered=False)
+        except Exception as e:
+            LOGGER.warning("Failed to flush drop state for %d chats: %s", len(operations), e)
+            # ✅ Retry on the next flush unless newer state is already pending
+            for chat_id, fields in pending.items():
+                if chat_id in self._states:
+                    self._dirty.add(chat_id)
+                else:
+                    self._evicted.setdefault(chat_id, fields)
+        finally:
+            if self._in_flight is pending:
+                self._in_flight = {}
+
+    def start(self, interval=FLUSH_INTERVAL):
+        self._flusher = asyncio.create_task(self._flush_loop(interval))
+
+    async def stop(self):
+        if self._flusher is not None:
+            self._flusher.cancel()
+            await asyncio.gather(self._flusher, return_exceptions=True)
+            self._flusher = None
+        await self.flush()
+
+    async def _flush_loop(self, interval):
+        while True:
+            await asyncio.sleep(interval)
+            await self.flush()
+
+
+chat_states = ChatStateStore()
+
+
+async def claim_drop(chat_id, state, token, user_id):
+    """Decides the single winner of a drop. Returns True only for that winner.
+
+    With SHARED_CLAIMS the claim is keyed on the chat and this process's drop token, so it only
+    keeps one process's drop from being won twice (e.g. by an update redelivered to another
+    worker that restored the same drop_state); processes that each send their own drop to a
+    chat have different tokens and each drop gets its own winner.
+    """
+    if not state.claim(token, user_id):
+        return False
+
+    if SHARED_CLAIMS:
+        # ✅ The unique _id makes the insert itself the compare-and-set across processes
+        try:
+            await drop_claims_collection.insert_one(
+                {'_id': f"{chat_id}:{token}", 'user_id': user_id, 'claimed_at': datetime.now(timezone.utc)}
+            )
+        except DuplicateKeyError:
+            return False  # another process won; the local state stays claimed
+        except Exception:
+            # ✅ Undo the local claim so the drop can still be won once Mongo is reachable
+            if state.drop_token == token and state.drop_winner == user_id:
+                state.drop_winner = None
+            raise
+
+    chat_states.mark_dirty(chat_id)
+    return True
+
+
+# Outcome of rejected guesses: replied to vs. silently collapsed into the next reply
+guess_reply_stats = {'sent': 0, 'suppressed': 0}
+
+
+def throttle_rejection(state, window=GUESS_REPLY_WINDOW):
+    """Rate-limits replies to wrong or late guesses in a chat.
+
+    Returns None if this rejection should get no reply, otherwise the number of rejections
+    suppressed since the last reply (to be summarized in this one).
+    """
+    now = time.monotonic()
+    if now < state.reject_until:
+        state.rejects_suppressed += 1
+        guess_reply_stats['suppressed'] += 1
+        return None
+
+    suppressed = state.rejects_suppressed
+    state.reject_until = now + window
+    state.rejects_suppressed = 0
+    guess_reply_stats['sent'] += 1
+    return suppressed
+
+
+async def get_droptime(chat_id):
+    """Returns the chat's droptime, reading Mongo only when the chat is not in memory."""
+    state = await chat_states.load(chat_id)
+    return state.droptime
+
+
+async def set_droptime(chat_id, droptime):
+    """Persists a new droptime and updates the in-memory state (write-through)."""
+    result = await user_totals_collection.update_one(
+        {'chat_id': str(chat_id)},
+        {'$set': {'message_frequency': droptime}},
+        upsert=True
+    )
+    state = chat_states.get(chat_id)
+    if state is not None:
+        state.droptime = droptime
+    return result
+
+
+class DropQueue:
+    """Hands drops from the counting path to a small pool of sender tasks.
+
+    message_counter only flips `drop_queued` and enqueues the chat id, so counting never waits
+    on Mongo or Telegram; the workers call `send(bot, chat_id)` and clear the flag afterwards.
+    """
+
+    def __init__(self, workers=DROP_WORKERS, maxsize=DROP_QUEUE_SIZE):
+        self.workers = workers
+        self.queue = asyncio.Queue(maxsize)
+        self.dropped = 0
+        self._tasks = []
+
+    def __len__(self):
+        return self.queue.qsize()
+
+    def enqueue(self, chat_id, state):
+        """Queues a drop for the chat; returns False if one is already queued or the queue is full."""
+        if state.drop_queued:
+            return False
+        try:
+            self.queue.put_nowait(chat_id)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            LOGGER.warning("Drop queue full, skipping drop in %s", chat_id)
+            return False
+        state.drop_queued = True
+        return True
+
+    def start(self, bot, send):
+        send = instrument(send, "drops.send_image")
+        for _ in range(self.workers):
+            self._tasks.append(asyncio.create_task(self._work(bot, send)))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+
+    async def _work(self, bot, send):
+        while True:
+            chat_id = await self.queue.get()
+            try:
+                await send(bot, chat_id)
+            except Exception:
+                LOGGER.exception("Drop failed in %s", chat_id)
+            finally:
+                state = chat_states.get(chat_id)
+                if state is not None:
+                    state.drop_queued = False
+                self.queue.task_done()
+
+
+drop_queue = DropQueue()
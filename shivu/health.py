@@ -0,0 +1,219 @@
+import asyncio
+import time
+
+from aiohttp import web
+
+from shivu import lol, mongo_monitor, HEALTH_PORT, LOGGER
+from shivu import metrics
+from shivu.catalog import catalog
+from shivu.drops import chat_states, drop_queue, guess_reply_stats
+from shivu.scheduler import scheduler
+from shivu.spamguard import command_limiter
+
+START_TIME = time.time()
+
+# Seconds between event-loop lag probes, and timeout for each readiness check
+LAG_PROBE_INTERVAL = 0.5
+READY_TIMEOUT = 5
+
+
+class LoopLagMonitor:
+    """Measures how late a periodic sleep wakes up, i.e. how long the loop was blocked."""
+
+    def __init__(self, interval=LAG_PROBE_INTERVAL):
+        self.interval = interval
+        self.lag = 0.0
+        self.max_lag = 0.0
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._probe())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    async def _probe(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            self.lag = max(0.0, loop.time() - start - self.interval)
+            self.max_lag = max(self.max_lag, self.lag)
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _ratio(hits, misses):
+    return hits / (hits + misses) if hits + misses else 1.0
+
+
+class HealthServer:
+    """Liveness, readiness and Prometheus metrics on the bot's own event loop."""
+
+    def __init__(self, application, port=HEALTH_PORT):
+        self.application = application
+        self.port = port
+        self.lag_monitor = LoopLagMonitor()
+        self.app = web.Application()
+        self.app.add_routes([
+            web.get("/", self.live),
+            web.get("/healthz", self.live),
+            web.get("/readyz", self.ready),
+            web.get("/metrics", self.metrics),
+        ])
+        self.webhook = None
+        self._runner = None
+
+    def add_webhook(self, path, receiver):
+        """Serves Telegram's webhook POSTs on `path` (must be called before `start()`)."""
+        self.webhook = receiver
+        self.app.router.add_post(path, receiver.handle)
+
+    async def start(self):
+        self.lag_monitor.start()
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, "0.0.0.0", self.port).start()
+        LOGGER.info("Health server listening on port %s", self.port)
+
+    async def stop(self):
+        await self.lag_monitor.stop()
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    async def live(self, request):
+        return web.Response(text="OK")
+
+    async def ready(self, request):
+        checks = {}
+        for name, check in (("mongo", lol.admin.command("ping")), ("telegram", self.application.bot.get_me())):
+            try:
+                await asyncio.wait_for(check, READY_TIMEOUT)
+                checks[name] = "ok"
+            except Exception as e:
+                checks[name] = f"error: {e}"
+        status = 200 if all(result == "ok" for result in checks.values()) else 503
+        return web.json_response(checks, status=status)
+
+    async def metrics(self, request):
+        return web.Response(text=self.render_metrics(), content_type="text/plain", charset="utf-8")
+
+    def render_metrics(self):
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                label_text = ",".join(f'{key}="{_label(val)}"' for key, val in labels.items())
+                lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+
+        metric("bot_uptime_seconds", "gauge", "Seconds since the process started.",
+               [({}, round(time.time() - START_TIME, 3))])
+        metric("bot_event_loop_lag_seconds", "gauge", "Last measured event loop lag.",
+               [({}, round(self.lag_monitor.lag, 6))])
+        metric("bot_event_loop_lag_max_seconds", "gauge", "Largest event loop lag seen.",
+               [({}, round(self.lag_monitor.max_lag, 6))])
+
+        # Handlers
+        stats = metrics.handler_stats
+        metric("bot_handler_calls_total", "counter", "Handler invocations.",
+               [({"handler": name}, s.count) for name, s in stats.items()])
+        metric("bot_handler_errors_total", "counter", "Handler invocations that raised.",
+               [({"handler": name}, s.errors) for name, s in stats.items()])
+        metric("bot_handler_in_flight", "gauge", "Handler invocations currently running.",
+               [({"handler": name}, s.in_flight) for name, s in stats.items()])
+        lines.append("# HELP bot_handler_latency_ms Handler latency in milliseconds.")
+        lines.append("# TYPE bot_handler_latency_ms histogram")
+        for name, s in stats.items():
+            handler = _label(name)
+            cumulative = 0
+            for bound, count in zip(metrics.LATENCY_BUCKETS_MS, s.latency.counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else bound
+                lines.append(f'bot_handler_latency_ms_bucket{{handler="{handler}",le="{le}"}} {cumulative}')
+            lines.append(f'bot_handler_latency_ms_sum{{handler="{handler}"}} {round(s.latency.sum_ms, 3)}')
+            lines.append(f'bot_handler_latency_ms_count{{handler="{handler}"}} {s.latency.total}')
+
+        metric("bot_handler_rejected_total", "counter", "Updates dropped because the user's queue or the scheduler was full.",
+               [({"handler": name}, s.rejected) for name, s in stats.items()])
+        metric("bot_scheduler_running", "gauge", "Handler bodies running under the concurrency cap.",
+               [({}, scheduler.running)])
+        metric("bot_scheduler_waiting", "gauge", "Updates waiting for their user's turn or a free slot.",
+               [({}, scheduler.waiting)])
+        metric("bot_scheduler_user_lanes", "gauge", "Users with serialized updates pending.",
+               [({}, scheduler.lanes)])
+        metric("bot_scheduler_shed_total", "counter", "Updates dropped because too many were waiting for a slot.",
+               [({}, scheduler.shed)])
+        wait = metrics.queue_wait
+        metric("bot_scheduler_wait_ms", "summary", "Time updates waited in the scheduler.", [
+            ({"quantile": "0.5"}, wait.percentile(0.5)),
+            ({"quantile": "0.99"}, wait.percentile(0.99)),
+        ])
+        lines.append(f"bot_scheduler_wait_ms_sum {round(wait.sum_ms, 3)}")
+        lines.append(f"bot_scheduler_wait_ms_count {wait.total}")
+
+        metric("bot_command_limit_total", "counter", "Commands checked by the per-user spam guard, by outcome.",
+               [({"class": name, "outcome": "allowed"}, count) for name, count in command_limiter.allowed.items()]
+               + [({"class": name, "outcome": "rejected"}, count) for name, count in command_limiter.rejected.items()])
+        metric("bot_command_limit_buckets", "gauge", "Per-user command buckets held in memory.",
+               [({}, len(command_limiter))])
+
+        # Outbound Telegram requests
+        limiter = self.application.bot.rate_limiter
+        if limiter is not None:
+            metric("bot_outbound_queued", "gauge", "Requests waiting for the global send bucket, by priority.",
+                   [({"priority": name}, count) for name, count in limiter.queued_by_priority().items()])
+            metric("bot_outbound_chat_waiting", "gauge", "Requests waiting for their chat's send bucket.",
+                   [({}, limiter.chat_wait)])
+            metric("bot_outbound_sent_total", "counter", "Rate limited requests sent, by priority.",
+                   [({"priority": name}, count) for name, count in limiter.sent.items()])
+            metric("bot_outbound_retries_total", "counter", "Requests retried after a flood wait.",
+                   [({}, limiter.retries)])
+            metric("bot_outbound_failed_total", "counter", "Requests that kept hitting flood waits.",
+                   [({}, limiter.failed)])
+            metric("bot_outbound_wait_seconds_total", "counter", "Time requests spent waiting to be sent.",
+                   [({}, round(limiter.wait_seconds, 3))])
+
+        # Queues and caches
+        metric("bot_drop_queue_depth", "gauge", "Drops waiting for a drop worker.", [({}, len(drop_queue))])
+        metric("bot_drop_queue_rejected_total", "counter", "Drops skipped because the queue was full.",
+               [({}, drop_queue.dropped)])
+        metric("bot_update_queue_depth", "gauge", "Updates waiting for dispatch.",
+               [({}, self.application.update_queue.qsize())])
+        if self.webhook is not None:
+            metric("bot_webhook_requests_total", "counter", "Webhook requests, by outcome.", [
+                ({"outcome": "accepted"}, self.webhook.received),
+                ({"outcome": "rejected"}, self.webhook.rejected),
+                ({"outcome": "queue_full"}, self.webhook.overflowed),
+            ])
+        metric("bot_chat_states", "gauge", "Chats held in memory.", [({}, len(chat_states))])
+        metric("bot_chat_state_pending_writes", "gauge", "Chats waiting for the next drop state flush.",
+               [({}, chat_states.pending_writes)])
+        metric("bot_cache_hit_ratio", "gauge", "Hit ratio of in-memory caches.",
+               [({"cache": "chat_states"}, round(_ratio(chat_states.hits, chat_states.misses), 4))])
+        metric("bot_catalog_reloads_total", "counter", "Catalog loads from Mongo, full or incremental.",
+               [({"kind": "full"}, catalog.reloads), ({"kind": "incremental"}, catalog.incremental_reloads)])
+        metric("bot_catalog_characters", "gauge", "Characters in the in-memory catalog.", [({}, len(catalog))])
+        metric("bot_boot_seconds", "gauge", "Seconds from process start to each startup milestone.",
+               [({"milestone": name}, round(seconds, 3)) for name, seconds in metrics.boot_timings.items()])
+        metric("bot_guess_replies_total", "counter", "Replies to rejected guesses, by outcome.",
+               [({"outcome": outcome}, count) for outcome, count in guess_reply_stats.items()])
+
+        # Mongo
+        mongo = mongo_monitor.snapshot()
+        for scope in ("handler", "collection"):
+            by_scope = mongo[f"by_{scope}"]
+            metric(f"bot_mongo_ops_by_{scope}_total", "counter", f"Mongo commands by {scope}.",
+                   [({scope: name}, s["ops"]) for name, s in by_scope.items()])
+            metric(f"bot_mongo_reply_bytes_by_{scope}_total", "counter", f"Mongo reply bytes by {scope}.",
+                   [({scope: name}, s["bytes"]) for name, s in by_scope.items()])
+            metric(f"bot_mongo_duration_ms_by_{scope}_total", "counter", f"Mongo command time by {scope}.",
+                   [({scope: name}, s["duration_ms"]) for name, s in by_scope.items()])
+
+        return "\n".join(lines) + "\n"
+
@@ -0,0 +1,82 @@
+import asyncio
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+
+from shivu import (
+    db, collection, user_collection, user_totals_collection, group_user_totals_collection,
+    top_global_groups_collection, auction_collection, LOGGER
+)
+from shivu.catalog import deletions_collection
+from shivu.drops import drop_claims_collection
+
+# Seconds a shared drop claim is kept (claims only matter while the drop is live)
+DROP_CLAIM_TTL = 24 * 60 * 60
+
+# Every index the bot's queries rely on, per collection
+INDEXES = {
+    collection: [
+        IndexModel([('id', ASCENDING)]),
+        IndexModel([('rarity', ASCENDING)]),
+        IndexModel([('category', ASCENDING)]),
+        IndexModel([('in_store', ASCENDING)]),
+        IndexModel([('catalog_rev', ASCENDING)]),   # incremental catalog reloads
+    ],
+    deletions_collection: [
+        IndexModel([('rev', ASCENDING)]),
+    ],
+    user_collection: [
+        IndexModel([('id', ASCENDING)]),
+        IndexModel([('owned.$**', ASCENDING)]),       # /check collectors, inline "guessed N times"
+        IndexModel([('owned_total', DESCENDING)]),    # /top
+        IndexModel([('characters.id', ASCENDING)]),   # same, for documents not migrated yet
+        IndexModel([('coins', DESCENDING), ('chrono_crystals', DESCENDING)]),   # /wtop
+    ],
+    user_totals_collection: [
+        IndexModel([('chat_id', ASCENDING)]),
+    ],
+    group_user_totals_collection: [
+        IndexModel([('group_id', ASCENDING), ('count', DESCENDING)]),   # /ctop
+        IndexModel([('user_id', ASCENDING), ('group_id', ASCENDING)]),  # guess upsert
+    ],
+    top_global_groups_collection: [
+        IndexModel([('count', DESCENDING)]),      # /TopGroups
+        IndexModel([('group_id', ASCENDING)]),    # guess upsert
+    ],
+    auction_collection: [
+        IndexModel([('status', ASCENDING)]),
+    ],
+    db.user_sorting: [
+        IndexModel([('user_id', ASCENDING)]),
+    ],
+    drop_claims_collection: [
+        IndexModel([('claimed_at', ASCENDING)], expireAfterSeconds=DROP_CLAIM_TTL),
+    ],
+}
+
+
+async def sync_collection(coll, models):
+    """Creates the indexes in `models` that `coll` does not have yet; returns how many were missing."""
+    existing = {tuple(info['key']) for info in (await coll.index_information()).values()}
+    missing = [model for model in models if tuple(model.document['key'].items()) not in existing]
+    if not missing:
+        return 0
+
+    for model in missing:
+        LOGGER.warning("Missing index on %s: %s, creating it", coll.name, dict(model.document['key']))
+    await coll.create_indexes(missing)
+    return len(missing)
+
+
+async def ensure_indexes():
+    """Diffs INDEXES against the database and builds whatever is missing. Awaited at startup."""
+    results = await asyncio.gather(
+        *(sync_collection(coll, models) for coll, models in INDEXES.items()),
+        return_exceptions=True
+    )
+    created = 0
+    for coll, result in zip(INDEXES, results):
+        if isinstance(result, Exception):
+            LOGGER.error("Could not sync indexes on %s: %s", coll.name, result)
+        else:
+            created += result
+    LOGGER.info("Indexes in sync: %d created across %d collections", created, len(INDEXES))
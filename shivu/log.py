@@ -0,0 +1,67 @@
+import atexit
+import logging
+import queue
+import random
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+LOG_FILE = "log.txt"
+LOG_MAX_BYTES = 5 * 1024 * 1024
+LOG_BACKUPS = 3
+LOG_FORMAT = "%(asctime)s - %(levelname)s - %(name)s - %(message)s"
+
+# Per-logger levels; Config.LOG_LEVELS entries override these
+LOG_LEVELS = {
+    "apscheduler": "ERROR",
+    "httpx": "WARNING",
+    "pyrate_limiter": "ERROR",
+    "shivu.drops": "INFO",
+}
+
+# Fraction of DEBUG records kept per logger, for loggers on hot paths
+LOG_SAMPLING = {
+    "shivu.drops": 0.01,
+}
+
+_listener = None
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps only a random `rate` fraction of DEBUG records; other levels always pass."""
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        return record.levelno > logging.DEBUG or random.random() < self.rate
+
+
+def setup_logging(level=logging.INFO, levels=None, sampling=None):
+    """Routes all logging through a queue drained by a background thread.
+
+    Handlers on the event loop only enqueue records; formatting to the console and the
+    size-rotated log file happens on the listener thread, so disk I/O never blocks the loop.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    formatter = logging.Formatter(LOG_FORMAT)
+    file_handler = RotatingFileHandler(LOG_FILE, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS, encoding="utf-8")
+    stream_handler = logging.StreamHandler()
+    for handler in (file_handler, stream_handler):
+        handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    root.handlers = [QueueHandler(log_queue)]
+    root.setLevel(level)
+
+    _listener = QueueListener(log_queue, file_handler, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+    for name, logger_level in {**LOG_LEVELS, **(levels or {})}.items():
+        logging.getLogger(name).setLevel(logger_level)
+    for name, rate in {**LOG_SAMPLING, **(sampling or {})}.items():
+        logging.getLogger(name).addFilter(SamplingFilter(rate))
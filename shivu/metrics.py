@@ -0,0 +1,181 @@
+import functools
+import math
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from telegram import Update
+from telegram._utils.defaultvalue import DEFAULT_TRUE, DefaultValue
+from telegram.ext import Application, ApplicationHandlerStop, ConversationHandler
+
+from shivu.scheduler import scheduler
+
+# Upper bounds (ms) of the latency histogram buckets; the last one catches everything else
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, math.inf)
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram; percentiles resolve to a bucket's upper bound."""
+
+    __slots__ = ("counts", "total", "sum_ms")
+
+    def __init__(self):
+        self.counts = [0] * len(LATENCY_BUCKETS_MS)
+        self.total = 0
+        self.sum_ms = 0.0
+
+    def observe(self, ms):
+        self.counts[bisect_left(LATENCY_BUCKETS_MS, ms)] += 1
+        self.total += 1
+        self.sum_ms += ms
+
+    def percentile(self, q):
+        if not self.total:
+            return 0.0
+        rank = q * self.total
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS_MS, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return LATENCY_BUCKETS_MS[-1]
+
+
+class HandlerStats:
+    __slots__ = ("count", "errors", "in_flight", "rejected", "latency")
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.rejected = 0  # updates dropped by the scheduler because the user's lane was full
+        self.latency = LatencyHistogram()
+
+    def as_dict(self):
+        return {
+            'count': self.count,
+            'errors': self.errors,
+            'in_flight': self.in_flight,
+            'rejected': self.rejected,
+            'avg_ms': round(self.latency.sum_ms / self.latency.total, 2) if self.latency.total else 0.0,
+            'p50_ms': self.latency.percentile(0.50),
+            'p95_ms': self.latency.percentile(0.95),
+            'p99_ms': self.latency.percentile(0.99),
+        }
+
+
+# handler name -> HandlerStats
+handler_stats = {}
+
+# Time updates spent waiting for their turn in the scheduler (see shivu/scheduler.py)
+queue_wait = LatencyHistogram()
+
+# Name of the handler the current task is running, for attributing work such as Mongo commands
+current_handler = ContextVar("current_handler", default="-")
+
+# Startup milestone -> seconds after the process started (see main.py)
+boot_timings = {}
+
+
+def record_boot(milestone, started):
+    """Records, once, how long after `started` (a time.monotonic() value) a milestone was reached."""
+    if milestone not in boot_timings:
+        boot_timings[milestone] = time.monotonic() - started
+    return boot_timings[milestone]
+
+
+def handler_name(callback):
+    """`module.function` for a handler callback, e.g. `harem.harem`."""
+    module = getattr(callback, "__module__", None) or "?"
+    return f"{module.rsplit('.', 1)[-1]}.{getattr(callback, '__qualname__', repr(callback))}"
+
+
+def instrument(callback, name=None, scheduled=True):
+    """Wraps an async callback to schedule it and record its call count, errors, in-flight count and latency.
+
+    Callbacks whose first argument is an Update run through the handler scheduler unless
+    `scheduled` is False; latency is measured from the moment the scheduler lets the handler run.
+    """
+    if getattr(callback, "__instrumented__", False):
+        return callback
+
+    name = name or handler_name(callback)
+    stats = handler_stats.setdefault(name, HandlerStats())
+    is_read_only = getattr(callback, "__read_only__", False)
+    is_scheduled = scheduled and not getattr(callback, "__unscheduled__", False)
+
+    async def run(args, kwargs):
+        stats.count += 1
+        stats.in_flight += 1
+        token = current_handler.set(name)
+        start = time.perf_counter()
+        try:
+            return await callback(*args, **kwargs)
+        except ApplicationHandlerStop:
+            raise
+        except Exception:
+            stats.errors += 1
+            raise
+        finally:
+            stats.in_flight -= 1
+            stats.latency.observe((time.perf_counter() - start) * 1000)
+            current_handler.reset(token)
+
+    @functools.wraps(callback)
+    async def wrapper(*args, **kwargs):
+        if not is_scheduled or not args or not isinstance(args[0], Update):
+            return await run(args, kwargs)
+
+        queued = time.perf_counter()
+        async with scheduler.slot(args[0], is_read_only) as admitted:
+            if not admitted:
+                stats.rejected += 1
+                return None
+            queue_wait.observe((time.perf_counter() - queued) * 1000)
+            return await run(args, kwargs)
+
+    wrapper.__instrumented__ = True
+    return wrapper
+
+
+def instrument_handler(handler, parent_block=DEFAULT_TRUE):
+    """Instruments a handler in place, including every handler nested in a ConversationHandler.
+
+    Blocking handlers are not scheduled: PTB already runs them one at a time in its update
+    fetcher, where waiting for a lane or a slot would hold up every other update.
+    """
+    if isinstance(handler, ConversationHandler):
+        nested = list(handler.entry_points) + list(handler.fallbacks)
+        for state_handlers in handler.states.values():
+            nested.extend(state_handlers)
+        for child in nested:
+            instrument_handler(child, handler._block)  # `block` of a ConversationHandler is always True
+        return handler
+
+    # ✅ Same resolution as PTB: the handler's own setting, then its ConversationHandler's
+    block = handler.block if handler.block is not DEFAULT_TRUE else parent_block
+
+    callback = getattr(handler, "callback", None)
+    if callback is not None:
+        handler.callback = instrument(callback, scheduled=not DefaultValue.get_value(block))
+    return handler
+
+
+def in_flight():
+    return sum(stats.in_flight for stats in handler_stats.values())
+
+
+def snapshot():
+    """Per-handler stats as plain dicts, busiest first."""
+    return dict(sorted(
+        ((name, stats.as_dict()) for name, stats in handler_stats.items()),
+        key=lambda item: item[1]['count'],
+        reverse=True
+    ))
+
+
+class InstrumentedApplication(Application):
+    """Application that instruments every handler as it is registered."""
+
+    def add_handler(self, handler, group=0):
+        super().add_handler(instrument_handler(handler), group)
@@ -4,16 +4,7 @@ import time
 
 StartTime = time.time()
 
-# enable logging
-logging.basicConfig(
-    format="%(asctime)s - %(levelname)s - %(name)s - %(message)s",
-    handlers=[logging.FileHandler("log.txt"), logging.StreamHandler()],
-    level=logging.INFO,
-)
-
-logging.getLogger("apscheduler").setLevel(logging.ERROR)
-
-logging.getLogger("pyrate_limiter").setLevel(logging.ERROR)
+# logging is configured in shivu/__init__.py (see shivu/log.py)
 LOGGER = logging.getLogger(__name__)
 
 # if version < 3.6, stop bot.
@@ -4,11 +4,15 @@ from bson import ObjectId
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import CommandHandler, CallbackContext, CallbackQueryHandler
 from shivu import application, user_collection, collection, OWNER_ID, auction_collection
+from shivu.ownership import grant_characters
+from shivu.taxonomy import rarity_label
 
 # ✅ Auction Duration & Settings
 AUCTION_DURATION = 600  # 10 minutes
 MIN_BID_INCREMENT = 200  # Minimum bid increment in CC
 
+_auction_timers = set()  # running end-of-auction timers (kept referenced until they fire)
+
 async def start_auction(update: Update, context: CallbackContext) -> None:
     """Allows owners to start an auction in the designated channel."""
     if update.effective_user.id != int(OWNER_ID):
@@ -72,7 +76,7 @@ async def start_auction(update: Update, context: CallbackContext) -> None:
             f"⚔ 𝘼𝙪𝙘𝙩𝙞𝙤𝙣 𝙎𝙩𝙖𝙧𝙩𝙚𝙙!\n"
             f"━━━━━━━━━━━━━━━━━━━━\n"
             f"🎴 𝘾𝙝𝙖𝙧𝙖𝙘𝙩𝙚𝙧: {character['name']}\n"
-            f"🎖 𝙍𝙖𝙧𝙞𝙩𝙮: {character.get('rarity', 'Unknown')}\n"
+            f"🎖 𝙍𝙖𝙧𝙞𝙩𝙮: {rarity_label(character.get('rarity'), 'Unknown')}\n"
             f"💰 𝙎𝙩𝙖𝙧𝙩𝙞𝙣𝙜 𝘽𝙞𝙙: {starting_bid} CC\n"
             f"👤 𝙃𝙞𝙜𝙝𝙚𝙨𝙩 𝘽𝙞𝙙𝙙𝙚𝙧: {auction_data['highest_bidder_name']}\n"
             f"📌 𝘿𝙪𝙧𝙖𝙩𝙞𝙤𝙣: 10 minutes\n"
@@ -91,9 +95,16 @@ async def start_auction(update: Update, context: CallbackContext) -> None:
 
     await update.message.reply_text("✅ **Auction started in the channel!**")
 
-    # ✅ Schedule auction ending
+    # ✅ Schedule auction ending in the background, so the owner's commands are not held up
+    timer = asyncio.create_task(end_auction_later(auction_doc.inserted_id, context))
+    _auction_timers.add(timer)
+    timer.add_done_callback(_auction_timers.discard)
+
+
+async def end_auction_later(auction_id, context: CallbackContext) -> None:
+    """Ends the auction once AUCTION_DURATION has passed."""
     await asyncio.sleep(AUCTION_DURATION)
-    await end_auction(auction_doc.inserted_id, context)
+    await end_auction(auction_id, context)
 
 
 async def handle_bid(update: Update, context: CallbackContext) -> None:
@@ -149,7 +160,7 @@ async def handle_bid(update: Update, context: CallbackContext) -> None:
             f"⚔ 𝗔𝘂𝗰𝘁𝗶𝗼𝗻 𝗢𝗻𝗴𝗼𝗶𝗻𝗴!\n"
             f"━━━━━━━━━━━━━━━━━━━━\n"
             f"🎴 <b>Character:</b> {auction['character']['name']}\n"
-            f"🎖 <b>Rarity:</b> {auction['character'].get('rarity', 'Unknown')}\n"
+            f"🎖 <b>Rarity:</b> {rarity_label(auction['character'].get('rarity'), 'Unknown')}\n"
             f"💰 <b>Highest Bid:</b> {new_bid} CC\n"
             f"👤 <b>Highest Bidder:</b> {user_first_name}\n"
             f"📌 <b>Auction Ending Soon!</b>\n"
@@ -176,10 +187,7 @@ async def end_auction(auction_id, context: CallbackContext) -> None:
     await auction_collection.update_one({"_id": ObjectId(auction_id)}, {"$set": {"status": "ended"}})
 
     if highest_bidder:
-        await user_collection.update_one(
-            {"id": highest_bidder},
-            {"$inc": {"chrono_crystals": -highest_bid}, "$push": {"characters": character}}
-        )
+        await grant_characters(highest_bidder, [character["id"]], {"$inc": {"chrono_crystals": -highest_bid}})
         
         try:
             await context.bot.send_message(
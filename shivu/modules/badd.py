@@ -1,7 +1,9 @@
 from bson import ObjectId
 from telegram import Update
 from telegram.ext import CommandHandler, CallbackContext
-from shivu import application, banners_collection, collection, sudo_users, OWNER_ID, CHARA_CHANNEL_ID
+from shivu import application, banners_collection, sudo_users, OWNER_ID, CHARA_CHANNEL_ID
+from shivu.catalog import catalog
+from shivu.taxonomy import RARITIES, get_rarity
 
 async def badd(update: Update, context: CallbackContext) -> None:
     """Moves a single character to a banner."""
@@ -28,7 +30,8 @@ async def badd(update: Update, context: CallbackContext) -> None:
             await update.message.reply_text("❌ No banner found with this ID!")
             return
 
-        character = await collection.find_one({"id": character_id})
+        await catalog.ensure_fresh()
+        character = catalog.get(character_id)
         if not character:
             await update.message.reply_text("❌ No character found with this ID in the main collection!")
             return
@@ -37,7 +40,7 @@ async def badd(update: Update, context: CallbackContext) -> None:
             await update.message.reply_text(f"⚠️ `{character['name']}` is already in `{banner['name']}`!")
             return
 
-        await banners_collection.update_one({"_id": banner_id}, {"$push": {"characters": character}})
+        await banners_collection.update_one({"_id": banner_id}, {"$push": {"characters": character.to_dict()}})
 
         await update.message.reply_text(f"✅ `{character['name']}` added to `{banner['name']}` banner!", parse_mode="Markdown")
 
@@ -69,7 +72,8 @@ async def baddall(update: Update, context: CallbackContext) -> None:
             await update.message.reply_text("❌ No banner found with this ID!")
             return
 
-        all_characters = await collection.find().to_list(length=None)
+        await catalog.ensure_fresh()
+        all_characters = [character.to_dict() for character in catalog.ordered]
         if not all_characters:
             await update.message.reply_text("❌ No characters found in the database!")
             return
@@ -106,20 +110,21 @@ async def baddrarity(update: Update, context: CallbackContext) -> None:
             await update.message.reply_text("❌ No banner found with this ID!")
             return
 
-        rarity = rarity.lower()
-        valid_rarities = ["common", "uncommon", "rare", "extreme", "sparking", "ultra"]
-        if rarity not in valid_rarities:
-            await update.message.reply_text(f"❌ Invalid rarity! Choose from: `{', '.join(valid_rarities)}`", parse_mode="Markdown")
+        rarity = get_rarity(rarity)
+        if rarity is None:
+            valid_rarities = ", ".join(f"{code} ({r.name.lower()})" for code, r in RARITIES.items())
+            await update.message.reply_text(f"❌ Invalid rarity! Choose from: `{valid_rarities}`", parse_mode="Markdown")
             return
 
-        rarity_characters = await collection.find({"rarity": rarity}).to_list(length=None)
+        await catalog.ensure_fresh()
+        rarity_characters = [character.to_dict() for character in catalog.with_rarity(rarity.code)]
         if not rarity_characters:
-            await update.message.reply_text(f"❌ No `{rarity}` characters found in the database!")
+            await update.message.reply_text(f"❌ No `{rarity.name}` characters found in the database!")
             return
 
         await banners_collection.update_one({"_id": banner_id}, {"$push": {"characters": {"$each": rarity_characters}}})
 
-        await update.message.reply_text(f"✅ **{len(rarity_characters)} `{rarity}` characters added to `{banner['name']}` banner!**", parse_mode="Markdown")
+        await update.message.reply_text(f"✅ **{len(rarity_characters)} `{rarity.name}` characters added to `{banner['name']}` banner!**", parse_mode="Markdown")
 
     except Exception as e:
         await update.message.reply_text(f"❌ Error: `{str(e)}`", parse_mode="Markdown")
@@ -1,12 +1,14 @@
 from telegram import Update
 from telegram.ext import CommandHandler, CallbackContext
 from shivu import application, user_collection
+from shivu.scheduler import read_only
 
 # Deposit & Withdraw Settings
 MIN_DEPOSIT = 500  # Minimum deposit amount
 MAX_WITHDRAW_PERCENT = 50  # Max 50% of bank balance per day
 
 # 🏦 **Check Bank Balance**
+@read_only
 async def check_balance(update: Update, context: CallbackContext):
     user_id = update.message.from_user.id
     user = await user_collection.find_one({"id": user_id}) or {"bank_balance": 0, "coins": 0}
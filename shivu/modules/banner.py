@@ -1,6 +1,7 @@
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import CommandHandler, CallbackContext, CallbackQueryHandler
 from shivu import application, banners_collection, OWNER_ID, sudo_users
+from shivu.scheduler import read_only
 from bson import ObjectId
 import shlex
   # First argument is command itself
@@ -46,6 +47,7 @@ async def create_banner(update: Update, context: CallbackContext) -> None:
 
 
 # ✅ List All Active Banners
+@read_only
 async def view_banners(update: Update, context: CallbackContext) -> None:
     banners = await banners_collection.find({}).to_list(length=10)  # Limit to 10 banners
 
@@ -1,7 +1,7 @@
 from telegram import Update
 from telegram.ext import CallbackContext, CommandHandler 
 
-from shivu import application, top_global_groups_collection, pm_users, OWNER_ID 
+from shivu import application, top_global_groups_collection, pm_users, OWNER_ID, LOGGER
 
 async def broadcast(update: Update, context: CallbackContext) -> None:
     
@@ -28,7 +28,7 @@ async def broadcast(update: Update, context: CallbackContext) -> None:
                                               from_chat_id=message_to_broadcast.chat_id,
                                               message_id=message_to_broadcast.message_id)
         except Exception as e:
-            print(f"Failed to send message to {chat_id}: {e}")
+            LOGGER.warning("Failed to send message to %s: %s", chat_id, e)
             failed_sends += 1
 
     await update.message.reply_text(f"Broadcast complete. Failed to send to {failed_sends} chats/users.")
@@ -1,26 +1,16 @@
 import random
-import asyncio
 from bson import ObjectId
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import CallbackContext, CommandHandler
 from shivu import application, banners_collection, user_collection
+from shivu.ownership import grant_characters, load_user, owned_counts
+from shivu.scheduler import scheduler
+from shivu.taxonomy import category_label, rarity_label, rarity_power, summon_rate
 
 SUMMON_COST_CC = 60  # Chrono Crystals per summon
 SUMMON_COST_TICKET = 1  # Summon Tickets per summon
 MAX_SUMMONS = 10  # Max summons per pull
 
-RARITY_ORDER = [
-    "⚪ Common", "🟢 Uncommon", "🔵 Rare", "🟣 Extreme",
-    "🟡 Sparking", "🔱 Ultra", "💠 Legends Limited",
-    "🔮 Zenkai", "🏆 Event-Exclusive"
-]
-
-DROP_RATES = {
-    "⚪ Common": 40, "🟢 Uncommon": 25, "🔵 Rare": 15, "🟣 Extreme": 10,
-    "🟡 Sparking": 6, "🔱 Ultra": 2, "💠 Legends Limited": 1,
-    "🔮 Zenkai": 0.5, "🏆 Event-Exclusive": 0.5
-}
-
 ANIMATION_FRAMES = [
     "🔮 **Summoning…** 🔮",
     "⚡ **Energy Gathering…** ⚡",
@@ -60,9 +50,9 @@ async def summon(update: Update, context: CallbackContext) -> None:
         return
 
     # ✅ Fetch or create user profile
-    user = await user_collection.find_one({'id': user_id})
+    user = await load_user(user_id)
     if not user:
-        user = {"id": user_id, "chrono_crystals": 0, "summon_tickets": 0, "characters": []}
+        user = {"id": user_id, "chrono_crystals": 0, "summon_tickets": 0, "owned": {}, "owned_total": 0}
         await user_collection.insert_one(user)
 
     # ✅ Check user balance
@@ -79,22 +69,22 @@ async def summon(update: Update, context: CallbackContext) -> None:
     # ✅ Start Summon Animation
     animation_message = await update.message.reply_text("🔮 **Summoning…**")
     for frame in ANIMATION_FRAMES:
-        await asyncio.sleep(1.2)
+        await scheduler.sleep(1.2)  # ✅ frees the handler slot between frames
         await animation_message.edit_text(frame, parse_mode="Markdown")
 
     # ✅ Weighted Character Selection
     def get_weighted_character():
-        available_characters = sorted(banner_characters, key=lambda c: DROP_RATES.get(c.get("rarity", "⚪ Common"), 0), reverse=True)
-        weights = [DROP_RATES.get(c.get("rarity", "⚪ Common"), 0) for c in available_characters]
+        available_characters = sorted(banner_characters, key=lambda c: summon_rate(c.get("rarity")), reverse=True)
+        weights = [summon_rate(c.get("rarity")) for c in available_characters]
         return random.choices(available_characters, weights=weights, k=1)[0]
 
     summoned_characters = [get_weighted_character() for _ in range(summon_count)]
 
     # ✅ Add to user's collection
-    await user_collection.update_one({'id': user_id}, {'$push': {'characters': {'$each': summoned_characters}}})
+    await grant_characters(user_id, [char['id'] for char in summoned_characters])
 
     # ✅ Identify rarest character
-    rarest_character = max(summoned_characters, key=lambda char: RARITY_ORDER.index(char.get('rarity', "⚪ Common")))
+    rarest_character = max(summoned_characters, key=lambda char: rarity_power(char.get('rarity')))
     rarest_image = rarest_character.get('file_id', "https://i.imgur.com/5h9N2JF.png")  # High-quality default image
 
     # ✅ Summon Result Message with Improved Formatting
@@ -103,11 +93,12 @@ async def summon(update: Update, context: CallbackContext) -> None:
         f"━━━━━━━━━━━━━━━━━━━━━━\n"
     )
     
+    already_owned = owned_counts(user)
     for char in summoned_characters:
-        new_tag = "🔥 **NEW!**" if char not in user.get("characters", []) else ""
+        new_tag = "🔥 **NEW!**" if char['id'] not in already_owned else ""
         summon_results += f"🔹 **{char.get('name', 'Unknown')}** {new_tag}\n" \
-                          f"🎖 **Rarity:** {char.get('rarity', '⚪ Common')}\n" \
-                          f"📌 **Category:** {char.get('category', 'N/A')}\n" \
+                          f"🎖 **Rarity:** {rarity_label(char.get('rarity'))}\n" \
+                          f"📌 **Category:** {category_label(char.get('category'), 'N/A')}\n" \
                           f"━━━━━━━━━━━━━━━━━━━━━━\n"
 
     keyboard = [[InlineKeyboardButton("💠 View Full Collection", switch_inline_query_current_chat=f"collection.{user_id}")]]
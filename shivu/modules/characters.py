@@ -1,14 +1,19 @@
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import CommandHandler, CallbackContext, CallbackQueryHandler
-from shivu import application, collection
+from shivu import application
+from shivu.catalog import catalog
+from shivu.scheduler import read_only
+from shivu.taxonomy import category_label, rarity_label
 
 # ✅ Number of characters per page
 CHARACTERS_PER_PAGE = 10
 
+@read_only
 async def list_characters(update: Update, context: CallbackContext, page=1) -> None:
     """Command to list characters from the database (Paginated)"""
     
-    total_characters = await collection.count_documents({})
+    await catalog.ensure_fresh()
+    total_characters = len(catalog)
     total_pages = (total_characters // CHARACTERS_PER_PAGE) + (1 if total_characters % CHARACTERS_PER_PAGE else 0)
 
     if total_characters == 0:
@@ -20,13 +25,12 @@ async def list_characters(update: Update, context: CallbackContext, page=1) -> N
         return
 
     # ✅ Fetch characters for the current page
-    characters = collection.find().skip((page - 1) * CHARACTERS_PER_PAGE).limit(CHARACTERS_PER_PAGE)
-    characters = await characters.to_list(length=CHARACTERS_PER_PAGE)
+    characters = catalog.ordered[(page - 1) * CHARACTERS_PER_PAGE : page * CHARACTERS_PER_PAGE]
 
     # ✅ Format message
     message = f"📜 **Character List (Page {page}/{total_pages})**\n\n"
     for char in characters:
-        message += f"🆔 `{char['id']}` | **{char['name']}**\n🎖️ {char['rarity']} | 🔹 **{char['category']}**\n\n"
+        message += f"🆔 `{char['id']}` | **{char['name']}**\n🎖️ {rarity_label(char['rarity'])} | 🔹 **{category_label(char['category'])}**\n\n"
 
     # ✅ Pagination buttons
     buttons = []
@@ -42,6 +46,7 @@ async def list_characters(update: Update, context: CallbackContext, page=1) -> N
     else:
         await update.callback_query.edit_message_text(message, reply_markup=reply_markup, parse_mode="Markdown")
 
+@read_only
 async def paginate_characters(update: Update, context: CallbackContext) -> None:
     """Handles inline button pagination"""
     query = update.callback_query
@@ -1,7 +1,12 @@
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import CommandHandler, CallbackContext, CallbackQueryHandler
-from shivu import application, collection, user_collection
+from shivu import application
+from shivu.catalog import catalog
+from shivu.ownership import top_owners
+from shivu.scheduler import read_only
+from shivu.taxonomy import category_label, rarity_label
 
+@read_only
 async def check_character(update: Update, context: CallbackContext) -> None:
     """Displays character details and collector buttons."""
     if len(context.args) != 1:
@@ -9,7 +14,8 @@ async def check_character(update: Update, context: CallbackContext) -> None:
         return
 
     character_id = context.args[0]
-    character = await collection.find_one({"id": character_id})
+    await catalog.ensure_fresh()
+    character = catalog.get(character_id)
 
     if not character:
         await update.message.reply_text("❌ **Character not found!**", parse_mode="Markdown")
@@ -17,8 +23,8 @@ async def check_character(update: Update, context: CallbackContext) -> None:
 
     # ✅ Extract Character Details
     name = character["name"]
-    rarity_text = character.get("rarity", "❓ Unknown Rarity")  
-    category_text = character.get("category", "❓ Unknown Category")
+    rarity_text = rarity_label(character.get("rarity"), "❓ Unknown Rarity")
+    category_text = category_label(character.get("category"), "❓ Unknown Category")
 
     message = (
         f"🎴 <b>Character:</b> {name}\n"
@@ -39,26 +45,14 @@ async def check_character(update: Update, context: CallbackContext) -> None:
         reply_markup=InlineKeyboardMarkup(keyboard)
     )
 
+@read_only
 async def show_top_collectors(update: Update, context: CallbackContext) -> None:
     """Displays top collectors for a specific character globally."""
     query = update.callback_query
     _, character_id = query.data.split(":")  
 
     # ✅ Fetch Top Collectors
-    pipeline = [
-        {"$match": {"characters.id": character_id}},  
-        {"$unwind": "$characters"},  
-        {"$match": {"characters.id": character_id}},  
-        {"$group": {
-            "_id": "$id",
-            "count": {"$sum": "$characters.count"},  
-            "first_name": {"$first": "$first_name"}  
-        }},
-        {"$sort": {"count": -1}},  
-        {"$limit": 5}  
-    ]
-
-    collectors = await user_collection.aggregate(pipeline).to_list(length=5)
+    collectors = await top_owners(character_id, 5)
 
     if not collectors:
         await query.answer("❌ No collectors found!", show_alert=True)
@@ -71,6 +65,7 @@ async def show_top_collectors(update: Update, context: CallbackContext) -> None:
 
     await query.message.edit_text(message, parse_mode="Markdown")
 
+@read_only
 async def show_local_collectors(update: Update, context: CallbackContext) -> None:
     """Displays collectors of a specific character in the current group."""
     query = update.callback_query
@@ -78,20 +73,7 @@ async def show_local_collectors(update: Update, context: CallbackContext) -> Non
     group_id = query.message.chat.id
 
     # ✅ Fetch all users who own the character
-    pipeline = [
-        {"$match": {"characters.id": character_id}},  
-        {"$unwind": "$characters"},  
-        {"$match": {"characters.id": character_id}},  
-        {"$group": {
-            "_id": "$id",
-            "count": {"$sum": "$characters.count"},  
-            "first_name": {"$first": "$first_name"}
-        }},
-        {"$sort": {"count": -1}},  
-        {"$limit": 10}  
-    ]
-
-    collectors = await user_collection.aggregate(pipeline).to_list(length=10)
+    collectors = await top_owners(character_id, 10)
 
     if not collectors:
         await query.answer("❌ No collectors found in this group!", show_alert=True)
@@ -1,9 +1,12 @@
-import asyncio
 import time
 import random
 from telegram import Update
 from telegram.ext import CommandHandler, CallbackContext
-from shivu import application, user_collection, collection
+from shivu import application, user_collection
+from shivu.catalog import catalog
+from shivu.ownership import grant_characters
+from shivu.scheduler import scheduler
+from shivu.taxonomy import category_label, rarity_label
 
 # 📌 Claim Limits
 MAX_CLAIMS = 1  # Users can claim once per day
@@ -33,7 +36,8 @@ async def claim(update: Update, context: CallbackContext) -> None:
                 "id": user_id,
                 "username": update.effective_user.username,
                 "first_name": update.effective_user.first_name,
-                "characters": [],
+                "owned": {},
+                "owned_total": 0,
                 "claims": 0,
                 "last_claim": 0,
                 "coins": 0,
@@ -61,40 +65,28 @@ async def claim(update: Update, context: CallbackContext) -> None:
             return
 
         # ✅ Fetch a random character from the database
-        total_characters = await collection.count_documents({})
-        if total_characters == 0:
+        await catalog.ensure_fresh()
+        random_character = catalog.random()
+        if random_character is None:
             await update.message.reply_text("❌ No characters available to claim!")
             return
 
-        pipeline = [{"$sample": {"size": 1}}]  # MongoDB's efficient random selection
-        random_character = await collection.aggregate(pipeline).to_list(length=1)
-
-        if not random_character:
-            await update.message.reply_text("❌ Failed to claim a character. Try again!")
-            return
-
-        random_character = random_character[0]  # Extract character data
-
         # ✅ Send GIF animation
         gif_message = await update.message.reply_animation(animation=GIF_FILE_ID, caption="✨ Claiming a character...")
 
-        # ✅ **Wait for 7 seconds before proceeding**
-        await asyncio.sleep(7)
+        # ✅ **Wait for 7 seconds before proceeding** (without holding a handler slot)
+        await scheduler.sleep(7)
 
         # ✅ **Ensure claimed character is saved correctly**
-        await user_collection.update_one(
-            {"id": user_id},
-            {
-                "$push": {"characters": random_character},
-                "$set": {"last_claim": current_time},
-                "$inc": {"claims": 1}
-            }
-        )
+        await grant_characters(user_id, [random_character["id"]], {
+            "$set": {"last_claim": current_time},
+            "$inc": {"claims": 1}
+        })
 
         # ✅ Prepare Character Message
         char_name = random_character["name"]
-        char_rarity = random_character.get("rarity", "Unknown")
-        char_category = random_character.get("category", "Unknown")
+        char_rarity = rarity_label(random_character.get("rarity"), "Unknown")
+        char_category = category_label(random_character.get("category"), "Unknown")
         char_file_id = random_character.get("file_id")
         char_img_url = random_character.get("img_url")
 
@@ -1,6 +1,8 @@
+from datetime import datetime, timezone
 from telegram import Update
 from telegram.ext import CommandHandler, CallbackContext
 from shivu import application, sudo_users, OWNER_ID, user_collection, collection
+from shivu.ownership import grant_characters
 
 # ✅ Function to erase a user's collection
 async def erase_collection(update: Update, context: CallbackContext) -> None:
@@ -17,7 +19,9 @@ async def erase_collection(update: Update, context: CallbackContext) -> None:
         user_id = int(args[0])
 
         # Remove all characters from the user's collection
-        result = await user_collection.update_one({"id": user_id}, {"$set": {"characters": []}})
+        result = await user_collection.update_one(
+            {"id": user_id}, {"$set": {"owned": {}, "owned_total": 0}, "$unset": {"characters": ""}}
+        )
 
         if result.modified_count > 0:
             await update.message.reply_text(f"✅ Successfully erased the collection of user `{user_id}`.")
@@ -49,7 +53,7 @@ async def add_character(update: Update, context: CallbackContext) -> None:
             return
 
         # Add character to the user's collection
-        result = await user_collection.update_one({"id": user_id}, {"$push": {"characters": character}}, upsert=True)
+        result = await grant_characters(user_id, [character_id], upsert=True)
 
         if result.modified_count > 0:
             await update.message.reply_text(f"✅ Added `{character['name']}` to `{user_id}`'s collection.")
@@ -76,13 +80,19 @@ async def add_all_characters(update: Update, context: CallbackContext) -> None:
         user_id = int(args[0])
 
         # Fetch all characters from the database
-        characters = await collection.find({}).to_list(length=None)
+        characters = await collection.find({}, {"id": 1}).to_list(length=None)
         if not characters:
             await update.message.reply_text("❌ No characters found in the database.")
             return
 
         # Add all characters to the user's collection
-        result = await user_collection.update_one({"id": user_id}, {"$set": {"characters": characters}}, upsert=True)
+        now = datetime.now(timezone.utc)
+        owned = {c["id"]: {"count": 1, "first_at": now, "last_at": now} for c in characters}
+        result = await user_collection.update_one(
+            {"id": user_id},
+            {"$set": {"owned": owned, "owned_total": len(owned)}, "$unset": {"characters": ""}},
+            upsert=True
+        )
 
         if result.modified_count > 0:
             await update.message.reply_text(f"✅ Added all `{len(characters)}` characters to `{user_id}`'s collection.")
@@ -1,40 +1,28 @@
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import CommandHandler, CallbackContext, CallbackQueryHandler
+from collections import Counter
 from itertools import groupby
 from html import escape
 import math
-from shivu import collection, user_collection, application, db
+from shivu import application, db
+from shivu.catalog import catalog
+from shivu.ownership import load_user, owned_characters, owned_total, resolve
+from shivu.scheduler import read_only
+from shivu.taxonomy import category_label, rarity_emoji, rarity_label
 
 DEFAULT_SORT = "category"
 
-CATEGORY_ICONS = {
-    "🏆 Saiyan": "🏆", "🔥 Hybrid Saiyan": "🔥", "🤖 Android": "🤖",
-    "❄️ Frieza Force": "❄️", "✨ God Ki": "✨", "💪 Super Warrior": "💪",
-    "🩸 Regeneration": "🩸", "🔀 Fusion Warrior": "🔀", "🤝 Duo": "🤝",
-    "🔱 Super Saiyan God SS": "🔱", "🗿 Ultra Instinct Sign": "🗿",
-    "⚡ Super Saiyan": "⚡", "❤️‍🔥 Dragon Ball Saga": "❤️‍🔥",
-    "💫 Majin Buu Saga": "💫", "👾 Cell Saga": "👾", "📽️ Sagas From the Movies": "📽️",
-    "☠️ Lineage Of Evil": "☠️", "🌏 Universe Survival Saga": "🌏"
-}
-
-RARITY_ICONS = {
-    "⛔ Common": "⛔",
-    "🍀 Rare": "🍀",
-    "🟣 Extreme": "🟣",
-    "🟡 Sparking": "🟡",
-    "🔱 Ultimate": "🔱",
-    "👑 Supreme": "👑",
-    "🔮 Limited Edition": "🔮",
-    "⛩️ Celestial": "⛩️"
-}
+# Fields the collection can be grouped by, with how a group is labelled
+SORT_LABELS = {"category": category_label, "rarity": rarity_label}
 
+@read_only
 async def harem(update: Update, context: CallbackContext, page=0, query=None) -> None:
     """Displays user's character collection with proper pagination."""
     user_id = update.effective_user.id
     first_name = escape(update.effective_user.first_name)  # Escape first name
-    user = await user_collection.find_one({'id': user_id})
+    user = await load_user(user_id)
 
-    if not user or not user.get("characters"):
+    if not user or not owned_total(user):
         message = "❌ <b>You don't have any characters in your collection yet!</b>"
         if query:
             await query.answer(message, show_alert=True)
@@ -61,11 +49,19 @@ async def generate_harem_message(user, page, first_name):
     """Generates harem message and inline keyboard for pagination."""
     user_id = user['id']
     user_pref = await db.user_sorting.find_one({'user_id': user_id}) or {"sort_by": DEFAULT_SORT}
-    sort_by = user_pref["sort_by"]
-
-    characters = sorted(user["characters"], key=lambda x: (x.get(sort_by, "Unknown"), x["id"]))
-    character_counts = {k: len(list(v)) for k, v in groupby(characters, key=lambda x: x["id"])}
-    unique_characters = list({character['id']: character for character in characters}.values())
+    sort_by = user_pref["sort_by"] if user_pref.get("sort_by") in SORT_LABELS else DEFAULT_SORT
+    group_label = SORT_LABELS[sort_by]
+    group_totals = catalog.totals(sort_by)  # in memory, so a page flip sends no catalog query
+
+    # ✅ Owned ids resolved against the catalog, one entry per character with its count
+    owned = await owned_characters(user)
+    character_counts = {character["id"]: count for character, count in owned}
+    # ✅ Codes first; a label left over from an unmigrated document sorts after them
+    unique_characters = sorted(
+        (character for character, _ in owned),
+        key=lambda x: (isinstance(x.get(sort_by, 0), str), x.get(sort_by, 0), x["id"])
+    )
+    owned_per_group = Counter(character.get(sort_by, 0) for character in unique_characters)
 
     total_pages = max(1, math.ceil(len(unique_characters) / 10))
     page = max(0, min(page, total_pages - 1))
@@ -78,19 +74,17 @@ async def generate_harem_message(user, page, first_name):
     )
 
     current_characters = unique_characters[page * 10 : (page + 1) * 10]
-    grouped_characters = {k: list(v) for k, v in groupby(current_characters, key=lambda x: x.get(sort_by, "Unknown"))}
-
-    for category, characters in grouped_characters.items():
-        category_count = await collection.count_documents({"category": category})
+    grouped_characters = {k: list(v) for k, v in groupby(current_characters, key=lambda x: x.get(sort_by, 0))}
 
-        harem_message += f"\n🫧 <b>{category}</b> ({len(characters)}/{category_count})\n\n"
+    for group, characters in grouped_characters.items():
+        harem_message += f"\n🫧 <b>{group_label(group)}</b> ({owned_per_group[group]}/{group_totals.get(group, 0)})\n\n"
 
         for character in characters:
             count = character_counts[character["id"]]
-            rarity_icon = RARITY_ICONS.get(character["rarity"], "🔹")
+            rarity_icon = rarity_emoji(character["rarity"])
             harem_message += f"[{character['id']}] {rarity_icon} {character['name']}  [×{count}]\n"
 
-    total_count = len(user['characters'])
+    total_count = owned_total(user)
     keyboard = [
         [InlineKeyboardButton(f"📜 See Collection ({total_count})", switch_inline_query_current_chat=f"collection.{user_id}")]
     ]
@@ -104,9 +98,11 @@ async def generate_harem_message(user, page, first_name):
         keyboard.append(nav_buttons)
 
     reply_markup = InlineKeyboardMarkup(keyboard)
-    fav_character = next((c for c in user["characters"] if c["id"] == user.get("favorites", [None])[0]), None)
+    fav_id = (user.get("favorites") or [None])[0]
+    fav_character = resolve(fav_id, user) if fav_id in character_counts else None
 
     return harem_message, reply_markup, fav_character
+@read_only
 async def harem_callback(update: Update, context: CallbackContext) -> None:
     """Handles pagination properly without sending a new message."""
     query = update.callback_query
@@ -134,6 +130,10 @@ async def sort_callback(update: Update, context: CallbackContext) -> None:
     _, sort_by = query.data.split(":")
     user_id = query.from_user.id
 
+    if sort_by not in SORT_LABELS:
+        await query.answer("❌ Invalid sort option!", show_alert=True)
+        return
+
     await db.user_sorting.update_one({"user_id": user_id}, {"$set": {"sort_by": sort_by}}, upsert=True)
 
     await query.answer(f"✅ Collection will now be sorted by {sort_by.capitalize()}")
@@ -2,28 +2,22 @@ import re
 import time
 from html import escape
 from cachetools import TTLCache
-from pymongo import MongoClient, ASCENDING
 
 from telegram import Update, InlineQueryResultPhoto
 from telegram.ext import InlineQueryHandler, CallbackContext, CommandHandler 
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
 
-from shivu import user_collection, collection, application, db
+from shivu import application
+from shivu.catalog import catalog
+from shivu.ownership import count_owners, load_user, owned_characters
+from shivu.scheduler import read_only
+from shivu.taxonomy import category_label, rarity_label
 
+# Indexes for these queries are created at startup by shivu/indexes.py
 
-# collection
-db.characters.create_index([('id', ASCENDING)])
-db.characters.create_index([('category', ASCENDING)])
-db.characters.create_index([('file_id', ASCENDING)])
-
-# user_collection
-db.user_collection.create_index([('characters.id', ASCENDING)])
-db.user_collection.create_index([('characters.name', ASCENDING)])
-db.user_collection.create_index([('characters.file_id', ASCENDING)])
-
-all_characters_cache = TTLCache(maxsize=10000, ttl=36000)
 user_collection_cache = TTLCache(maxsize=10000, ttl=60)
 
+@read_only
 async def inlinequery(update: Update, context: CallbackContext) -> None:
     query = update.inline_query.query
     offset = int(update.inline_query.offset) if update.inline_query.offset else 0
@@ -34,28 +28,31 @@ async def inlinequery(update: Update, context: CallbackContext) -> None:
             if user_id in user_collection_cache:
                 user = user_collection_cache[user_id]
             else:
-                user = await user_collection.find_one({'id': int(user_id)})
+                user = await load_user(int(user_id), {'id': 1, 'first_name': 1})
+                if user:
+                    user['owned_characters'] = await owned_characters(user)
                 user_collection_cache[user_id] = user
 
             if user:
-                all_characters = list({v['id']:v for v in user['characters']}.values())
+                all_characters = [character for character, _ in user['owned_characters']]
+                user_counts = {character['id']: count for character, count in user['owned_characters']}
+                user_category_counts = {}
+                for character, count in user['owned_characters']:
+                    user_category_counts[character['category']] = user_category_counts.get(character['category'], 0) + count
                 if search_terms:
                     regex = re.compile(' '.join(search_terms), re.IGNORECASE)
-                    all_characters = [character for character in all_characters if regex.search(character['name']) or regex.search(character['category'])]
+                    all_characters = [character for character in all_characters if regex.search(character['name']) or regex.search(category_label(character['category']))]
             else:
                 all_characters = []
         else:
             all_characters = []
     else:
+        await catalog.ensure_fresh()
         if query:
             regex = re.compile(query, re.IGNORECASE)
-            all_characters = list(await collection.find({"$or": [{"name": regex}, {"category": regex}]}).to_list(length=None))
+            all_characters = catalog.search(regex)
         else:
-            if 'all_characters' in all_characters_cache:
-                all_characters = all_characters_cache['all_characters']
-            else:
-                all_characters = list(await collection.find({}).to_list(length=None))
-                all_characters_cache['all_characters'] = all_characters
+            all_characters = catalog.ordered
 
     characters = all_characters[offset:offset+50]
     if len(characters) > 50:
@@ -66,15 +63,15 @@ async def inlinequery(update: Update, context: CallbackContext) -> None:
 
     results = []
     for character in characters:
-        global_count = await user_collection.count_documents({'characters.id': character['id']})
-        anime_characters = await collection.count_documents({'category': character['category']})
+        global_count = await count_owners(character['id'])
+        anime_characters = catalog.category_totals.get(character['category'], 0)
 
         if query.startswith('collection.'):
-            user_character_count = sum(c['id'] == character['id'] for c in user['characters'])
-            user_anime_characters = sum(c['category'] == character['category'] for c in user['characters'])
-            caption = f"<b> Look At <a href='tg://user?id={user['id']}'>{(escape(user.get('first_name', user['id'])))}</a>'s Character</b>\n\n👤: <b>{character['name']} (x{user_character_count})</b>\n⚜: <b>{character['category']} ({user_anime_characters}/{anime_characters})</b>\n<b>{character['rarity']}</b>\n\n<b>🆔️:</b> {character['id']}"
+            user_character_count = user_counts[character['id']]
+            user_anime_characters = user_category_counts.get(character['category'], 0)
+            caption = f"<b> Look At <a href='tg://user?id={user['id']}'>{(escape(user.get('first_name', user['id'])))}</a>'s Character</b>\n\n👤: <b>{character['name']} (x{user_character_count})</b>\n⚜: <b>{category_label(character['category'])} ({user_anime_characters}/{anime_characters})</b>\n<b>{rarity_label(character['rarity'])}</b>\n\n<b>🆔️:</b> {character['id']}"
         else:
-            caption = f"<b>Look At This Character !!</b>\n\n:👤<b> {character['name']}</b>\n:⚜<b>{character['category']}</b>\n<b>{character['rarity']}</b>\n🆔️: <b>{character['id']}</b>\n\n<b>Globally Guessed {global_count} Times...</b>"
+            caption = f"<b>Look At This Character !!</b>\n\n:👤<b> {character['name']}</b>\n:⚜<b>{category_label(character['category'])}</b>\n<b>{rarity_label(character['rarity'])}</b>\n🆔️: <b>{character['id']}</b>\n\n<b>Globally Guessed {global_count} Times...</b>"
         results.append(
             InlineQueryResultPhoto(
                 thumbnail_url=character['file_id'],
@@ -7,6 +7,8 @@ from shivu import (
     application, PHOTO_URL, OWNER_ID, user_collection,
     top_global_groups_collection, group_user_totals_collection, sudo_users as SUDO_USERS
 )
+from shivu.ownership import top_collectors
+from shivu.scheduler import read_only
 
 # ✅ Fetch a random image from predefined list
 def get_random_photo():
@@ -17,11 +19,12 @@ def truncate_name(name, max_length=15):
     return name[:max_length] + "..." if len(name) > max_length else name
 
 # ✅ Leaderboard for Top 10 Global Groups
+@read_only
 async def global_leaderboard(update: Update, context: CallbackContext) -> None:
     cursor = top_global_groups_collection.aggregate([
-        {"$project": {"group_name": 1, "count": 1}},
         {"$sort": {"count": -1}},
-        {"$limit": 10}
+        {"$limit": 10},
+        {"$project": {"group_name": 1, "count": 1}}
     ])
     leaderboard_data = await cursor.to_list(length=10)
 
@@ -34,13 +37,14 @@ async def global_leaderboard(update: Update, context: CallbackContext) -> None:
     await update.message.reply_photo(photo=get_random_photo(), caption=message, parse_mode="HTML")
 
 # ✅ Leaderboard for Top 10 Users in a Group
+@read_only
 async def ctop(update: Update, context: CallbackContext) -> None:
     chat_id = update.effective_chat.id
     cursor = group_user_totals_collection.aggregate([
         {"$match": {"group_id": chat_id}},
-        {"$project": {"username": 1, "first_name": 1, "character_count": "$count"}},
-        {"$sort": {"character_count": -1}},
-        {"$limit": 10}
+        {"$sort": {"count": -1}},  # served by the (group_id, count) index
+        {"$limit": 10},
+        {"$project": {"username": 1, "first_name": 1, "character_count": "$count"}}
     ])
     leaderboard_data = await cursor.to_list(length=10)
 
@@ -54,13 +58,9 @@ async def ctop(update: Update, context: CallbackContext) -> None:
     await update.message.reply_photo(photo=get_random_photo(), caption=message, parse_mode="HTML")
 
 # ✅ Global Leaderboard (Top 10 Users with Most Characters)
+@read_only
 async def leaderboard(update: Update, context: CallbackContext) -> None:
-    cursor = user_collection.aggregate([
-        {"$project": {"username": 1, "first_name": 1, "character_count": {"$size": "$characters"}}},
-        {"$sort": {"character_count": -1}},
-        {"$limit": 10}
-    ])
-    leaderboard_data = await cursor.to_list(length=10)
+    leaderboard_data = await top_collectors(10)
 
     message = "👑 <b>Top 10 Users (Most Characters Collected)</b>\n━━━━━━━━━━━━━━━━━━\n"
     for i, user in enumerate(leaderboard_data, start=1):
@@ -72,6 +72,7 @@ async def leaderboard(update: Update, context: CallbackContext) -> None:
     await update.message.reply_photo(photo=get_random_photo(), caption=message, parse_mode="HTML")
 
 # ✅ Stats for Total Users & Groups (Owner Only)
+@read_only
 async def stats(update: Update, context: CallbackContext) -> None:
     if update.effective_user.id != OWNER_ID:
         await update.message.reply_text("❌ You are not authorized to use this command.")
@@ -83,12 +84,13 @@ async def stats(update: Update, context: CallbackContext) -> None:
     await update.message.reply_text(f"📊 <b>Bot Stats</b>\n━━━━━━━━━━━━━━━━━━\n👥 Users: <b>{user_count}</b>\n🏘 Groups: <b>{group_count}</b>", parse_mode="HTML")
 
 # ✅ Send Users List as a Document (Sudo Only)
+@read_only
 async def send_users_document(update: Update, context: CallbackContext) -> None:
     if update.effective_user.id not in SUDO_USERS:
         await update.message.reply_text("❌ Only for Sudo Users!")
         return
 
-    cursor = user_collection.find({})
+    cursor = user_collection.find({}, {'first_name': 1})
     users = [user['first_name'] for user in await cursor.to_list(length=None)]
     
     with open("users.txt", "w") as f:
@@ -98,6 +100,7 @@ async def send_users_document(update: Update, context: CallbackContext) -> None:
     os.remove("users.txt")
 
 # ✅ Send Groups List as a Document (Sudo Only)
+@read_only
 async def send_groups_document(update: Update, context: CallbackContext) -> None:
     if update.effective_user.id not in SUDO_USERS:
         await update.message.reply_text("❌ Only for Sudo Users!")
@@ -113,12 +116,13 @@ async def send_groups_document(update: Update, context: CallbackContext) -> None
     os.remove("groups.txt")
 
 
+@read_only
 async def top_wealth(update: Update, context: CallbackContext) -> None:
     """Shows Top 10 Users with Most Zeni (💰) and Chrono Crystals (💎)."""
     cursor = user_collection.aggregate([
-        {"$project": {"username": 1, "first_name": 1, "coins": 1, "chrono_crystals": 1}},
         {"$sort": {"coins": -1, "chrono_crystals": -1}},  # Sort by Zeni first, then CC
-        {"$limit": 10}
+        {"$limit": 10},
+        {"$project": {"username": 1, "first_name": 1, "coins": 1, "chrono_crystals": 1}}
     ])
     leaderboard_data = await cursor.to_list(length=10)
 
@@ -4,7 +4,9 @@ from telegram import Update
 from telegram.ext import CommandHandler, CallbackContext
 
 from shivu import application, sudo_users
+from shivu.scheduler import read_only
 
+@read_only
 async def ping(update: Update, context: CallbackContext) -> None:
     if str(update.effective_user.id) not in sudo_users:
         update.message.reply_text("Nouu.. its Sudo user's Command..")
@@ -1,18 +1,9 @@
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import CommandHandler, CallbackContext
-from shivu import user_collection, application
-
-# 🔹 Default Power Levels Based on Rarity
-RARITY_POWER = {
-    "⛔ Common": 100,
-    "🍀 Rare": 300,
-    "🟣 Extreme": 800,
-    "🟡 Sparking": 1500,
-    "🔱 Ultimate": 2500,
-    "👑 Supreme": 4000,
-    "🔮 Limited Edition": 6000,
-    "⛩️ Celestial": 10000
-}
+from shivu import application
+from shivu.ownership import load_user, owned_characters, owned_total
+from shivu.scheduler import read_only
+from shivu.taxonomy import RARITIES, rarity_code, rarity_power
 
 # 🔹 Power Titles Based on Power Level
 POWER_TITLES = [
@@ -26,28 +17,31 @@ POWER_TITLES = [
     (float("inf"), "👑 Omni-King")
 ]
 
+@read_only
 async def powerlevel(update: Update, context: CallbackContext) -> None:
     """Shows user's power level, title, and character breakdown."""
     user_id = update.effective_user.id
-    user = await user_collection.find_one({'id': user_id})
+    user = await load_user(user_id, {'id': 1})
 
-    if not user or not user.get("characters"):
+    if not user or not owned_total(user):
         await update.message.reply_text("❌ You don’t own any characters yet!", parse_mode="HTML")
         return
 
     # 🔹 Calculate Power Level Based on Rarity
-    power_level = sum(RARITY_POWER.get(char["rarity"], 100) for char in user["characters"])
+    owned = await owned_characters(user)
+    power_level = sum(rarity_power(char["rarity"]) * count for char, count in owned)
 
     # 🔹 Assign Power Level Title Dynamically
     title = next(t[1] for t in POWER_TITLES if power_level < t[0])
     
     # 🔹 Character Breakdown by Rarity
-    rarity_count = {r: 0 for r in RARITY_POWER.keys()}
-    for char in user["characters"]:
-        if char["rarity"] in rarity_count:
-            rarity_count[char["rarity"]] += 1
+    rarity_count = {code: 0 for code in sorted(RARITIES, key=rarity_power)}
+    for char, count in owned:
+        code = rarity_code(char["rarity"])
+        if code in rarity_count:
+            rarity_count[code] += count
     
-    rarity_display = "\n".join(f"{r} → {count} characters" for r, count in rarity_count.items() if count > 0)
+    rarity_display = "\n".join(f"{RARITIES[code].label} → {count} characters" for code, count in rarity_count.items() if count > 0)
 
     # 🔹 Power Progress Bar
     max_pl = 150000  # Adjust based on game balance
@@ -59,7 +53,7 @@ async def powerlevel(update: Update, context: CallbackContext) -> None:
         f"⚡ <b>{update.effective_user.first_name}'s Power Level</b>\n"
         f"💥 <b>Total PL:</b> {power_level:,}\n"
         f"🏷️ <b>Title:</b> {title}\n"
-        f"📦 <b>Total Characters Owned:</b> {len(user['characters'])}\n"
+        f"📦 <b>Total Characters Owned:</b> {owned_total(user)}\n"
         f"━━━━━━━━━━━━━━━━━━━━\n"
         f"📊 <b>Power Progress:</b> [{bar}] ({int(progress * 100)}%)\n"
         f"━━━━━━━━━━━━━━━━━━━━\n"
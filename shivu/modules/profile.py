@@ -1,6 +1,8 @@
 from telegram import Update
 from telegram.ext import CommandHandler, CallbackContext
-from shivu import application, user_collection
+from shivu import application
+from shivu.ownership import load_user, owned_total
+from shivu.scheduler import read_only
 
 # 🏆 Rank System
 RANKS = [
@@ -19,10 +21,11 @@ def get_rank(total_characters):
             return rank
     return "🆕 Newbie"
 
+@read_only
 async def profile(update: Update, context: CallbackContext) -> None:
     """Displays the user's profile with improved UI."""
     user_id = update.effective_user.id
-    user = await user_collection.find_one({'id': user_id}) or {}
+    user = await load_user(user_id, {'coins': 1, 'chrono_crystals': 1, 'summon_tickets': 1, 'exclusive_tokens': 1}) or {}
 
     # ✅ Initialize missing fields
     user.setdefault("coins", 0)
@@ -30,7 +33,7 @@ async def profile(update: Update, context: CallbackContext) -> None:
     user.setdefault("summon_tickets", 0)
     user.setdefault("exclusive_tokens", 0)
 
-    total_characters = len(user.get("characters", []))
+    total_characters = owned_total(user)
     rank = get_rank(total_characters)
 
     # 🏆 **Enhanced Profile UI**
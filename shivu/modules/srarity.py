@@ -1,27 +1,21 @@
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import CommandHandler, CallbackContext, CallbackQueryHandler
-from shivu import application, collection
+from shivu import application
+from shivu.catalog import catalog
+from shivu.scheduler import read_only
+from shivu.taxonomy import RARITIES
 
-# ✅ Rarity Dictionary with Symbols
-RARITIES = {
-    "1": ("⛔", "Common"),
-    "2": ("🍀", "Rare"),
-    "3": ("🟣", "Extreme"),
-    "4": ("🟡", "Sparking"),
-    "5": ("🔮", "Limited Edition"),
-    "6": ("🔱", "Ultimate"),
-    "7": ("👑", "Supreme"),
-    "8": ("⛩️", "Celestial"),
-}
 
+@read_only
 async def srarity(update: Update, context: CallbackContext) -> None:
     """Shows all rarities as inline buttons."""
-    keyboard = [[InlineKeyboardButton(f"{symbol} {name}", callback_data=f"rarity:{key}:1")]
-                for key, (symbol, name) in RARITIES.items()]
+    keyboard = [[InlineKeyboardButton(rarity.label, callback_data=f"rarity:{code}:1")]
+                for code, rarity in RARITIES.items()]
     reply_markup = InlineKeyboardMarkup(keyboard)
 
     await update.message.reply_text("🌟 **Select a Rarity:**", reply_markup=reply_markup, parse_mode="Markdown")
 
+@read_only
 async def show_rarity(update: Update, context: CallbackContext) -> None:
     """Displays characters of a specific rarity with pagination."""
     query = update.callback_query
@@ -29,13 +23,15 @@ async def show_rarity(update: Update, context: CallbackContext) -> None:
     page = int(page)
 
     # ✅ Get Rarity Symbol & Name
-    if rarity_key not in RARITIES:
+    rarity = RARITIES.get(int(rarity_key)) if rarity_key.isdigit() else None
+    if rarity is None:
         await query.answer("❌ Invalid rarity selected!", show_alert=True)
         return
-    rarity_symbol, rarity_name = RARITIES[rarity_key]
+    rarity_symbol, rarity_name = rarity.emoji, rarity.name
 
     # ✅ Fetch Characters of Selected Rarity
-    characters = await collection.find({"rarity": f"{rarity_symbol} {rarity_name}"}).to_list(length=1000)
+    await catalog.ensure_fresh()
+    characters = catalog.with_rarity(rarity.code)
     total_chars = len(characters)
     per_page = 15
     start = (page - 1) * per_page
@@ -2,18 +2,21 @@ import random
 import asyncio
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import CommandHandler, CallbackQueryHandler, ConversationHandler, MessageHandler, filters, CallbackContext
-from shivu import application, collection, user_collection, OWNER_ID
+from shivu import application, collection, user_collection, OWNER_ID, LOGGER
+from shivu.catalog import catalog, publish_characters
+from shivu.ownership import grant_characters
+from shivu.taxonomy import SPARKING, ULTIMATE, SUPREME, CELESTIAL, LIMITED_EDITION, rarity_label
 
 STORE_COLLECTION = "exclusive_store"
 MAX_STORE_ITEMS = 5
 
 # Fixed Prices for Rarity
 RARITY_PRICES = {
-    "🟡 Sparking": 600,
-    "🔱 Ultimate": 2500,
-    "👑 Supreme": 10000, 
-    "⛩️ Celestial": 5000,
-    "🔮 Limited Edition": 1800
+    SPARKING: 600,
+    ULTIMATE: 2500,
+    SUPREME: 10000,
+    CELESTIAL: 5000,
+    LIMITED_EDITION: 1800
 }
 
 # Conversation states
@@ -21,23 +24,27 @@ SELECT_ID, CONFIRM_PURCHASE = range(2)
 
 # ✅ Refresh store with 5 random high-rarity characters
 async def refresh_store():
-    await collection.update_many({}, {"$set": {"in_store": False}})
-    high_rarity = list(RARITY_PRICES.keys())
+    previous = await collection.find({"in_store": True}, {"id": 1}).to_list(None)
+    await collection.update_many({"in_store": True}, {"$set": {"in_store": False}})
 
-    characters = await collection.aggregate([
-        {"$match": {"rarity": {"$in": high_rarity}}},
-        {"$sample": {"size": MAX_STORE_ITEMS}}
-    ]).to_list(None)
+    await catalog.ensure_fresh()
+    high_rarity = [char for rarity in RARITY_PRICES for char in catalog.with_rarity(rarity)]
+    characters = random.sample(high_rarity, min(MAX_STORE_ITEMS, len(high_rarity)))
 
     for char in characters:
-        char["stock"] = random.randint(1, 4)
-        char["price"] = RARITY_PRICES.get(char["rarity"], 1000)
-        char["in_store"] = True
-        await collection.update_one({"_id": char["_id"]}, {"$set": char})
+        await collection.update_one({"id": char["id"]}, {"$set": {
+            "stock": random.randint(1, 4),
+            "price": RARITY_PRICES.get(char["rarity"], 1000),
+            "in_store": True
+        }})
+
+    # ✅ Push the new store contents into the in-memory catalog
+    await publish_characters({char["id"] for char in previous} | {char["id"] for char in characters})
 
 # ✅ Display store with all characters on one page
 async def exclusive_store(update: Update, context: CallbackContext):
-    store_chars = await collection.find({"in_store": True}).to_list(None)
+    await catalog.ensure_fresh()
+    store_chars = catalog.in_store
     
     if not store_chars:
         await update.message.reply_text("❌ The Exclusive Store is currently empty!")
@@ -46,7 +53,7 @@ async def exclusive_store(update: Update, context: CallbackContext):
     text = "🏪 **Exclusive Store** (Refreshes Weekly)\n\n"
     
     for char in store_chars:
-        text += f"🆔 `{char['id']}` {char['rarity']} **{char['name']}** (Stock: {char['stock']}X)\n"
+        text += f"🆔 `{char['id']}` {rarity_label(char['rarity'])} **{char['name']}** (Stock: {char['stock']}X)\n"
         text += f"💎 **Price:** {char['price']} CC\n\n"
 
     keyboard = [
@@ -70,12 +77,13 @@ async def start_purchase(update: Update, context: CallbackContext):
 async def verify_character(update: Update, context: CallbackContext):
     char_id = update.message.text.strip()
     user_id = update.message.from_user.id
-    print(f"🔍 Received Character ID: {char_id}")  
+    LOGGER.debug("Received Character ID: %s", char_id)
 
-    character = await collection.find_one({"id": char_id, "in_store": True})
-    print(f"🔍 Character Found: {character}")  
+    await catalog.ensure_fresh()
+    character = catalog.get(char_id)
+    LOGGER.debug("Character Found: %s", character)
 
-    if not character or character["stock"] <= 0:
+    if not character or not character.get("in_store") or character.get("stock", 0) <= 0:
         await update.message.reply_text("❌ Invalid ID or character out of stock!")
         return SELECT_ID
 
@@ -114,11 +122,9 @@ async def confirm_purchase(update: Update, context: CallbackContext):
         await query.message.edit_text("❌ You don’t have enough Chrono Crystals!")
         return ConversationHandler.END
 
-    await user_collection.update_one({"id": user_id}, {
-        "$inc": {"chrono_crystals": -character["price"]},
-        "$push": {"characters": character}
-    })
+    await grant_characters(user_id, [character["id"]], {"$inc": {"chrono_crystals": -character["price"]}})
     await collection.update_one({"id": character["id"]}, {"$inc": {"stock": -1}})
+    await publish_characters([character["id"]])
 
     await query.message.edit_text(f"🎉 Successfully purchased **{character['name']}**!\n💎 Remaining CC: {user['chrono_crystals'] - character['price']}")
     return ConversationHandler.END
@@ -139,7 +145,8 @@ async def add_store_character(update: Update, context: CallbackContext):
 
     try:
         char_id, stock = context.args
-        character = await collection.find_one({"id": char_id})
+        await catalog.ensure_fresh()
+        character = catalog.get(char_id)
         if not character:
             await update.message.reply_text("❌ Character not found!")
             return
@@ -148,10 +155,12 @@ async def add_store_character(update: Update, context: CallbackContext):
             await update.message.reply_text("❌ This rarity is not allowed in the store!")
             return
 
-        character["price"] = RARITY_PRICES[character["rarity"]]
-        character["stock"] = int(stock)
-        character["in_store"] = True
-        await collection.update_one({"id": char_id}, {"$set": character})
+        await collection.update_one({"id": char_id}, {"$set": {
+            "price": RARITY_PRICES[character["rarity"]],
+            "stock": int(stock),
+            "in_store": True
+        }})
+        await publish_characters([char_id])
 
         await update.message.reply_text(f"✅ **{character['name']}** added to the store!")
     except ValueError:
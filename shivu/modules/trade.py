@@ -1,49 +1,57 @@
-from pyrogram import filters
-from pyrogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-from shivu import user_collection, shivuu
+from html import escape
+
+from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
+from telegram.ext import CommandHandler, CallbackContext, CallbackQueryHandler
+from shivu import application, user_collection
+from shivu.catalog import catalog
+from shivu.ownership import grant_characters, load_user, owned_counts, resolve, take_character
 
 pending_trades = {}
 pending_gifts = {}
 
 ### **⚡ Trade System**
-@shivuu.on_message(filters.command("trade"))
-async def trade(client, message):
+async def trade(update: Update, context: CallbackContext):
+    message = update.message
     sender_id = message.from_user.id
 
     if not message.reply_to_message:
-        await message.reply_text("⚠️ **You must reply to a user to trade a character!**")
+        await message.reply_text("⚠️ <b>You must reply to a user to trade a character!</b>", parse_mode="HTML")
         return
 
-    receiver_id = message.reply_to_message.from_user.id
+    receiver_user = message.reply_to_message.from_user
+    receiver_id = receiver_user.id
 
     if sender_id == receiver_id:
-        await message.reply_text("❌ **You can't trade characters with yourself!**")
+        await message.reply_text("❌ <b>You can't trade characters with yourself!</b>", parse_mode="HTML")
         return
 
-    if len(message.command) != 3:
-        await message.reply_text("🛠 **Usage:** `/trade <your_character_id> <their_character_id>`")
+    if len(context.args) != 2:
+        await message.reply_text("🛠 <b>Usage:</b> <code>/trade &lt;your_character_id&gt; &lt;their_character_id&gt;</code>", parse_mode="HTML")
         return
 
-    sender_character_id, receiver_character_id = message.command[1], message.command[2]
+    sender_character_id, receiver_character_id = context.args[0], context.args[1]
 
-    sender = await user_collection.find_one({'id': sender_id})
-    receiver = await user_collection.find_one({'id': receiver_id})
+    await catalog.ensure_fresh()
+    sender = await load_user(sender_id, {'id': 1})
+    receiver = await load_user(receiver_id, {'id': 1})
+    sender_counts = owned_counts(sender) if sender else {}
+    receiver_counts = owned_counts(receiver) if receiver else {}
 
-    if not sender or not sender.get('characters'):
-        await message.reply_text("❌ **You don't have any characters to trade!**")
+    if not sender_counts:
+        await message.reply_text("❌ <b>You don't have any characters to trade!</b>", parse_mode="HTML")
         return
-    if not receiver or not receiver.get('characters'):
-        await message.reply_text("❌ **The other user doesn't have any characters to trade!**")
+    if not receiver_counts:
+        await message.reply_text("❌ <b>The other user doesn't have any characters to trade!</b>", parse_mode="HTML")
         return
 
-    sender_character = next((c for c in sender['characters'] if c['id'] == sender_character_id), None)
-    receiver_character = next((c for c in receiver['characters'] if c['id'] == receiver_character_id), None)
+    sender_character = resolve(sender_character_id, sender) if sender_character_id in sender_counts else None
+    receiver_character = resolve(receiver_character_id, receiver) if receiver_character_id in receiver_counts else None
 
     if not sender_character:
-        await message.reply_text("❌ **You don't own the character you're trying to trade!**")
+        await message.reply_text("❌ <b>You don't own the character you're trying to trade!</b>", parse_mode="HTML")
         return
     if not receiver_character:
-        await message.reply_text("❌ **The other user doesn't own the character you're trying to trade for!**")
+        await message.reply_text("❌ <b>The other user doesn't own the character you're trying to trade for!</b>", parse_mode="HTML")
         return
 
     pending_trades[(sender_id, receiver_id)] = (sender_character_id, receiver_character_id)
@@ -54,88 +62,92 @@ async def trade(client, message):
     ])
 
     await message.reply_text(
-        f"🔄 **Trade Request:**\n"
-        f"🟢 **{message.from_user.mention}** wants to trade **{sender_character['name']}**\n"
-        f"🔵 **{message.reply_to_message.from_user.mention}**'s **{receiver_character['name']}**\n\n"
-        f"⚠️ **{message.reply_to_message.from_user.first_name}, do you accept this trade?**",
+        f"🔄 <b>Trade Request:</b>\n"
+        f"🟢 <b>{message.from_user.mention_html()}</b> wants to trade <b>{escape(sender_character['name'])}</b>\n"
+        f"🔵 <b>{receiver_user.mention_html()}</b>'s <b>{escape(receiver_character['name'])}</b>\n\n"
+        f"⚠️ <b>{escape(receiver_user.first_name)}, do you accept this trade?</b>",
+        parse_mode="HTML",
         reply_markup=keyboard
     )
 
-@shivuu.on_callback_query(filters.regex(r"^(confirm_trade|cancel_trade):(\d+):(\d+)$"))
-async def trade_callback(client, callback_query):
-    action, sender_id, receiver_id = callback_query.data.split(":")
+async def trade_callback(update: Update, context: CallbackContext):
+    query = update.callback_query
+    action, sender_id, receiver_id = query.data.split(":")
     sender_id, receiver_id = int(sender_id), int(receiver_id)
 
     if (sender_id, receiver_id) not in pending_trades:
-        await callback_query.answer("⚠️ This trade is no longer active!", show_alert=True)
+        await query.answer("⚠️ This trade is no longer active!", show_alert=True)
         return
 
-    sender = await user_collection.find_one({'id': sender_id})
-    receiver = await user_collection.find_one({'id': receiver_id})
+    sender_exists = await user_collection.count_documents({'id': sender_id}, limit=1)
+    receiver_exists = await user_collection.count_documents({'id': receiver_id}, limit=1)
 
-    if not sender or not receiver:
-        del pending_trades[(sender_id, receiver_id)]
-        await callback_query.message.edit_text("❌ **Trade Failed: One or both users no longer exist!**")
+    if not sender_exists or not receiver_exists:
+        pending_trades.pop((sender_id, receiver_id), None)
+        await query.edit_message_text("❌ <b>Trade Failed: One or both users no longer exist!</b>", parse_mode="HTML")
         return
 
     sender_character_id, receiver_character_id = pending_trades.pop((sender_id, receiver_id))
 
     if action == "confirm_trade":
-        sender_character = next((c for c in sender['characters'] if c['id'] == sender_character_id), None)
-        receiver_character = next((c for c in receiver['characters'] if c['id'] == receiver_character_id), None)
-
-        if not sender_character or not receiver_character:
-            await callback_query.message.edit_text("❌ **Trade Failed: One or both characters no longer exist!**")
+        await catalog.ensure_fresh()
+        sender_character = resolve(sender_character_id)
+        receiver_character = resolve(receiver_character_id)
+
+        # ✅ Take one instance from each side; undo the first if the second is gone
+        taken = sender_character and receiver_character and await take_character(sender_id, sender_character_id)
+        if taken and not await take_character(receiver_id, receiver_character_id):
+            await grant_characters(sender_id, [sender_character_id])
+            taken = False
+        if not taken:
+            await query.edit_message_text("❌ <b>Trade Failed: One or both characters no longer exist!</b>", parse_mode="HTML")
             return
 
-        # ✅ Swap one instance of the character
-        sender['characters'].remove(sender_character)
-        receiver['characters'].remove(receiver_character)
-        sender['characters'].append(receiver_character)
-        receiver['characters'].append(sender_character)
+        await grant_characters(sender_id, [receiver_character_id])
+        await grant_characters(receiver_id, [sender_character_id])
 
-        await user_collection.update_one({'id': sender_id}, {'$set': {'characters': sender['characters']}})
-        await user_collection.update_one({'id': receiver_id}, {'$set': {'characters': receiver['characters']}})
-
-        await callback_query.message.edit_text(
-            f"✅ **Trade Successful!**\n"
-            f"🔄 **{sender_character['name']}** ⇄ **{receiver_character['name']}**"
+        await query.edit_message_text(
+            f"✅ <b>Trade Successful!</b>\n"
+            f"🔄 <b>{escape(sender_character['name'])}</b> ⇄ <b>{escape(receiver_character['name'])}</b>",
+            parse_mode="HTML"
         )
     else:
-        del pending_trades[(sender_id, receiver_id)]
-        await callback_query.message.edit_text("❌ **Trade Cancelled!**")
+        await query.edit_message_text("❌ <b>Trade Cancelled!</b>", parse_mode="HTML")
 
 
 ### **🎁 Gift System**
-@shivuu.on_message(filters.command("gift"))
-async def gift(client, message):
+async def gift(update: Update, context: CallbackContext):
+    message = update.message
     sender_id = message.from_user.id
 
     if not message.reply_to_message:
-        await message.reply_text("⚠️ **Reply to a user to gift a character!**")
+        await message.reply_text("⚠️ <b>Reply to a user to gift a character!</b>", parse_mode="HTML")
         return
 
-    receiver_id = message.reply_to_message.from_user.id
+    receiver_user = message.reply_to_message.from_user
+    receiver_id = receiver_user.id
 
     if sender_id == receiver_id:
-        await message.reply_text("❌ **You can't gift a character to yourself!**")
+        await message.reply_text("❌ <b>You can't gift a character to yourself!</b>", parse_mode="HTML")
         return
 
-    if len(message.command) != 2:
-        await message.reply_text("🛠 **Usage:** `/gift <character_id>`")
+    if len(context.args) != 1:
+        await message.reply_text("🛠 <b>Usage:</b> <code>/gift &lt;character_id&gt;</code>", parse_mode="HTML")
         return
 
-    character_id = message.command[1]
-    sender = await user_collection.find_one({'id': sender_id})
+    character_id = context.args[0]
+    await catalog.ensure_fresh()
+    sender = await load_user(sender_id, {'id': 1})
+    sender_counts = owned_counts(sender) if sender else {}
 
-    if not sender or not sender.get('characters'):
-        await message.reply_text("❌ **You have no characters to gift!**")
+    if not sender_counts:
+        await message.reply_text("❌ <b>You have no characters to gift!</b>", parse_mode="HTML")
         return
 
-    character = next((c for c in sender['characters'] if c['id'] == character_id), None)
+    character = resolve(character_id, sender) if character_id in sender_counts else None
 
     if not character:
-        await message.reply_text("❌ **You don't own this character!**")
+        await message.reply_text("❌ <b>You don't own this character!</b>", parse_mode="HTML")
         return
 
     pending_gifts[(sender_id, receiver_id)] = character
@@ -146,39 +158,45 @@ async def gift(client, message):
     ])
 
     await message.reply_text(
-        f"🎁 **Gift Request:**\n"
-        f"🎀 **{message.from_user.mention}** wants to gift **{character['name']}** to **{message.reply_to_message.from_user.mention}**!\n\n"
-        f"⚠️ **{message.reply_to_message.from_user.first_name}, do you accept this gift?**",
+        f"🎁 <b>Gift Request:</b>\n"
+        f"🎀 <b>{message.from_user.mention_html()}</b> wants to gift <b>{escape(character['name'])}</b> to <b>{receiver_user.mention_html()}</b>!\n\n"
+        f"⚠️ <b>{escape(receiver_user.first_name)}, do you accept this gift?</b>",
+        parse_mode="HTML",
         reply_markup=keyboard
     )
 
 
-@shivuu.on_callback_query(filters.regex(r"^(confirm_gift|cancel_gift):(\d+):(\d+)$"))
-async def gift_callback(client, callback_query):
-    action, sender_id, receiver_id = callback_query.data.split(":")
+async def gift_callback(update: Update, context: CallbackContext):
+    query = update.callback_query
+    action, sender_id, receiver_id = query.data.split(":")
     sender_id, receiver_id = int(sender_id), int(receiver_id)
 
     if (sender_id, receiver_id) not in pending_gifts:
-        await callback_query.answer("⚠️ This gift request is no longer active!", show_alert=True)
+        await query.answer("⚠️ This gift request is no longer active!", show_alert=True)
         return
 
-    sender = await user_collection.find_one({'id': sender_id})
-    receiver = await user_collection.find_one({'id': receiver_id})
+    sender_exists = await user_collection.count_documents({'id': sender_id}, limit=1)
+    receiver_exists = await user_collection.count_documents({'id': receiver_id}, limit=1)
 
-    if not sender or not receiver:
-        await callback_query.message.edit_text("❌ **Gift Failed: One or both users no longer exist!**")
+    if not sender_exists or not receiver_exists:
+        await query.edit_message_text("❌ <b>Gift Failed: One or both users no longer exist!</b>", parse_mode="HTML")
         return
 
     character = pending_gifts.pop((sender_id, receiver_id))
 
     if action == "confirm_gift":
         # ✅ Remove only one instance from sender
-        sender['characters'].remove(character)
-        receiver['characters'].append(character)
-
-        await user_collection.update_one({'id': sender_id}, {'$set': {'characters': sender['characters']}})
-        await user_collection.update_one({'id': receiver_id}, {'$set': {'characters': receiver['characters']}})
+        if not await take_character(sender_id, character['id']):
+            await query.edit_message_text("❌ <b>Gift Failed: You no longer own this character!</b>", parse_mode="HTML")
+            return
+        await grant_characters(receiver_id, [character['id']])
 
-        await callback_query.message.edit_text(f"✅ **Gift Successful!**\n🎁 **{character['name']}** has been gifted!")
+        await query.edit_message_text(f"✅ <b>Gift Successful!</b>\n🎁 <b>{escape(character['name'])}</b> has been gifted!", parse_mode="HTML")
     else:
-        await callback_query.message.edit_text("❌ **Gift Cancelled!**")
+        await query.edit_message_text("❌ <b>Gift Cancelled!</b>", parse_mode="HTML")
+
+
+application.add_handler(CommandHandler("trade", trade, block=False))
+application.add_handler(CallbackQueryHandler(trade_callback, pattern=r"^(confirm_trade|cancel_trade):(\d+):(\d+)$", block=False))
+application.add_handler(CommandHandler("gift", gift, block=False))
+application.add_handler(CallbackQueryHandler(gift_callback, pattern=r"^(confirm_gift|cancel_gift):(\d+):(\d+)$", block=False))
@@ -2,7 +2,10 @@ import requests
 from pymongo import ReturnDocument
 from telegram import Update
 from telegram.ext import CommandHandler, CallbackContext
-from shivu import application, sudo_users, OWNER_ID, collection, db, CHARA_CHANNEL_ID, SUPPORT_CHAT, user_collection
+from shivu import application, sudo_users, OWNER_ID, collection, db, CHARA_CHANNEL_ID, SUPPORT_CHAT
+from shivu.catalog import publish_characters, publish_deletions
+from shivu.ownership import remove_everywhere
+from shivu.taxonomy import CATEGORIES, RARITIES, get_category, get_rarity
 
 # ✅ Correct command usage instructions
 WRONG_FORMAT_TEXT = """❌ Incorrect Format!
@@ -59,7 +62,9 @@ async def upload(update: Update, context: CallbackContext) -> None:
         return
 
     try:
-        args = context.args
+        # ✅ Check if character is exclusive (stored as a flag; the category stays a plain code)
+        is_exclusive = "exclusive" in context.args
+        args = [arg for arg in context.args if arg != "exclusive"]
         if len(args) < 4:  # Minimum required arguments
             await update.message.reply_text(WRONG_FORMAT_TEXT)
             return
@@ -69,11 +74,6 @@ async def upload(update: Update, context: CallbackContext) -> None:
         category_input = args[-1]  # Last argument is category
         character_name = ' '.join(args[1:-2]).replace('-', ' ').title()  # Everything in between is the name
 
-        # ✅ Check if character is exclusive
-        is_exclusive = "exclusive" in args
-        if is_exclusive:
-            category_input += " (Exclusive)"  # Append to category for database clarity
-
         # ✅ Validate file_id by checking if it exists using Telegram's API
         try:
             await context.bot.get_file(file_id)  # Attempt to get the file from Telegram servers
@@ -82,44 +82,14 @@ async def upload(update: Update, context: CallbackContext) -> None:
             return
 
 
-        rarity_map = {
-            "1": "⛔ Common",
-            "2": "🍀 Rare",
-            "3": "🟣 Extreme",
-            "4": "🟡 Sparking",
-            "5": "🔮 Limited Edition",
-            "6": "🔱 Ultimate",
-            "7": "⛩️ Celestial",
-            "8": "👑 Supreme"
-        }
-        rarity = rarity_map.get(rarity_input)
+        rarity = get_rarity(rarity_input)
         if not rarity:
-            await update.message.reply_text("❌ Invalid Rarity. Use numbers: 1-9.")
+            await update.message.reply_text(f"❌ Invalid Rarity. Use numbers: 1-{len(RARITIES)}.")
             return
 
-        category_map = {
-            "1": "🏆 Saiyan",
-            "2": "🔥 Hybrid Saiyan",
-            "3": "🤖 Android",
-            "4": "❄️ Frieza Force",
-            "5": "✨ God Ki",
-            "6": "💪 Super Warrior",
-            "7": "🩸 Regeneration",
-            "8": "🔀 Fusion Warrior",
-            "9": "🤝 Duo",
-           "10":"🔱 Super Saiyan God SS",
-           "11": "🗿 Ultra Instinct Sign",
-           "12": "⚡ Super Saiyan",
-           "13": "❤️‍🔥 Dragon Ball Saga",
-           "14": "💫 Majin Buu Saga",
-           "15": "👾 Cell Saga",
-           "16": "📽️ Sagas From the Movies",
-           "17": "☠️ Lineage Of Evil",
-           "18": "🌏 Universe Survival Saga"
-        }
-        category = category_map.get(category_input)
+        category = get_category(category_input)
         if not category:
-            await update.message.reply_text("❌ Invalid Category. Use numbers: 1-9.")
+            await update.message.reply_text(f"❌ Invalid Category. Use numbers: 1-{len(CATEGORIES)}.")
             return
 
         char_id = str(await get_next_sequence_number("character_id")).zfill(3)
@@ -127,8 +97,8 @@ async def upload(update: Update, context: CallbackContext) -> None:
         character = {
             'file_id': file_id,
             'name': character_name,
-            'rarity': rarity,
-            'category': category,
+            'rarity': rarity.code,
+            'category': category.code,
             'id': char_id,
             'exclusive': is_exclusive  # Mark as exclusive if applicable
         }
@@ -137,8 +107,8 @@ async def upload(update: Update, context: CallbackContext) -> None:
             caption_text = (
                 f"🏆 **New Character Added!**\n\n"
                 f"🔥 **Character:** {character_name}\n"
-                f"🎖️ **Rarity:** {rarity}\n"
-                f"🔹 **Category:** {category}\n"
+                f"🎖️ **Rarity:** {rarity.label}\n"
+                f"🔹 **Category:** {category.label}\n"
                 f"🆔 **ID:** {char_id}\n\n"
                 f"👤 Added by [{update.effective_user.first_name}](tg://user?id={user_id})"
             )
@@ -155,6 +125,7 @@ async def upload(update: Update, context: CallbackContext) -> None:
 
             character["message_id"] = message.message_id
             await collection.insert_one(character)
+            await publish_characters([char_id])
             await update.message.reply_text(f"✅ `{character_name}` successfully added!")
         except Exception as e:
             await update.message.reply_text(f"⚠️ Character added, but couldn't send image. Error: {str(e)}")
@@ -184,12 +155,10 @@ async def delete(update: Update, context: CallbackContext) -> None:
 
         # Delete the character from the main collection
         await collection.delete_one({"id": character_id})
+        await publish_deletions([character_id])
 
         # Delete from users' collections
-        await user_collection.update_many(
-            {}, 
-            {"$pull": {"characters": {"id": character_id}}}  # Remove character from all users' collections
-        )
+        await remove_everywhere(character_id)
 
         # Try deleting the character's message from the character channel
         try:
@@ -218,28 +187,23 @@ async def update(update: Update, context: CallbackContext) -> None:
         
         character_id, field, new_value = args[0], args[1], ' '.join(args[2:])
 
-        valid_fields = ["file_id", "name", "rarity", "category"]
+        valid_fields = ["file_id", "name", "rarity", "category", "aliases"]
         if field not in valid_fields:
             await update.message.reply_text(f"❌ Invalid field! Use one of: {', '.join(valid_fields)}")
             return
         
         # Handle rarity separately
-        rarity_map = {
-            "1": "⛔ Common",
-            "2": "🍀 Rare",
-            "3": "🟣 Extreme",
-            "4": "🟡 Sparking",
-            "5": "🔮 Limited Edition",
-            "6": "🔱 Ultimate",
-            "7": "⛩️ Celestial",
-            "8": "👑 Supreme"
-        }
-        
-        if field == "rarity":
-            if new_value not in rarity_map:
-                await update.message.reply_text("❌ Invalid rarity. Use numbers 1-9.")
+        if field in ("rarity", "category"):
+            entry = get_rarity(new_value) if field == "rarity" else get_category(new_value)
+            if not entry:
+                limit = len(RARITIES) if field == "rarity" else len(CATEGORIES)
+                await update.message.reply_text(f"❌ Invalid {field}. Use numbers 1-{limit}.")
                 return
-            new_value = rarity_map[new_value]
+            new_value = entry.code
+
+        # Aliases are extra accepted guesses, comma separated: /update 042 aliases Kakarot, Goku Black
+        if field == "aliases":
+            new_value = [alias.strip() for alias in new_value.split(',') if alias.strip()]
 
         # Update character in database
         result = await collection.find_one_and_update(
@@ -247,6 +211,7 @@ async def update(update: Update, context: CallbackContext) -> None:
         )
 
         if result:
+            await publish_characters([character_id])
             await update.message.reply_text(f"✅ Character `{character_id}` updated successfully!")
         else:
             await update.message.reply_text("❌ Character not found.")
@@ -0,0 +1,131 @@
+import threading
+import time
+from collections import deque
+
+import bson
+from pymongo import monitoring
+
+from shivu.metrics import current_handler
+
+# Commands slower than this (ms) are kept in the slow-operation log
+SLOW_OP_MS = 100
+SLOW_LOG_SIZE = 200
+
+# Encoding each reply to count its size costs some CPU on the driver threads
+MEASURE_REPLY_BYTES = True
+
+# Where each command keeps the filter worth showing in the slow log
+_FILTER_KEYS = {
+    'find': 'filter',
+    'count': 'query',
+    'distinct': 'query',
+    'findAndModify': 'query',
+}
+
+
+def filter_shape(value):
+    """Replaces every value in a filter with 1, keeping only its structure."""
+    if isinstance(value, dict):
+        return {key: filter_shape(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [filter_shape(value[0])] if value else []
+    return 1
+
+
+def command_filter(command_name, command):
+    if command_name in _FILTER_KEYS:
+        return command.get(_FILTER_KEYS[command_name])
+    if command_name == 'aggregate':
+        pipeline = command.get('pipeline') or [{}]
+        return pipeline[0].get('$match', pipeline[0])
+    if command_name in ('update', 'delete'):
+        statements = command.get(command_name + 's') or [{}]
+        return statements[0].get('q')
+    return None
+
+
+class OpStats:
+    __slots__ = ("ops", "errors", "bytes", "duration_ms")
+
+    def __init__(self):
+        self.ops = 0
+        self.errors = 0
+        self.bytes = 0
+        self.duration_ms = 0.0
+
+    def as_dict(self):
+        return {
+            'ops': self.ops,
+            'errors': self.errors,
+            'bytes': self.bytes,
+            'duration_ms': round(self.duration_ms, 2),
+        }
+
+
+class MongoMonitor(monitoring.CommandListener):
+    """Aggregates Mongo commands per originating handler and per collection.
+
+    The handler comes from the `current_handler` contextvar set by the instrumented handler
+    wrapper; Motor copies the context into its executor threads, where these events fire.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}
+        self.by_handler = {}
+        self.by_collection = {}
+        self.slow_ops = deque(maxlen=SLOW_LOG_SIZE)
+
+    def started(self, event):
+        collection = event.command.get(event.command_name)
+        if not isinstance(collection, str):
+            collection = event.command.get('collection') if event.command_name == 'getMore' else None
+        self._pending[(event.connection_id, event.request_id)] = (
+            current_handler.get(),
+            f"{event.database_name}.{collection}" if collection else event.database_name,
+            event.command_name,
+            command_filter(event.command_name, event.command),
+        )
+
+    def succeeded(self, event):
+        size = len(bson.encode(event.reply)) if MEASURE_REPLY_BYTES else 0
+        self._finish(event, size, failed=False)
+
+    def failed(self, event):
+        self._finish(event, 0, failed=True)
+
+    def _finish(self, event, size, failed):
+        pending = self._pending.pop((event.connection_id, event.request_id), None)
+        if pending is None:
+            return
+        handler, collection, command_name, command_filter_ = pending
+        duration_ms = event.duration_micros / 1000
+
+        with self._lock:
+            for stats in (
+                self.by_handler.setdefault(handler, OpStats()),
+                self.by_collection.setdefault(collection, OpStats()),
+            ):
+                stats.ops += 1
+                stats.errors += failed
+                stats.bytes += size
+                stats.duration_ms += duration_ms
+
+            if duration_ms >= SLOW_OP_MS:
+                self.slow_ops.append({
+                    'at': time.time(),
+                    'handler': handler,
+                    'collection': collection,
+                    'command': command_name,
+                    'filter': filter_shape(command_filter_) if command_filter_ is not None else None,
+                    'duration_ms': round(duration_ms, 2),
+                    'failed': failed,
+                })
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'by_handler': {name: stats.as_dict() for name, stats in self.by_handler.items()},
+                'by_collection': {name: stats.as_dict() for name, stats in self.by_collection.items()},
+                'slow_ops': list(self.slow_ops),
+            }
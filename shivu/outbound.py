@@ -0,0 +1,250 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from collections import OrderedDict
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+from shivu.scheduler import scheduler
+
+LOGGER = logging.getLogger(__name__)
+
+# Priority classes, lowest number first. Pass one as `rate_limit_args` to override the endpoint default.
+PRIORITY_HIGH = 0     # drops and guess results
+PRIORITY_NORMAL = 1   # ordinary replies
+PRIORITY_LOW = 2      # broadcasts, animations and caption edits
+
+# Telegram limits: ~30 messages/s overall, ~1/s in one private chat, 20/min in one group
+GLOBAL_RATE = 30
+GLOBAL_BURST = 30
+PRIVATE_RATE = 1
+PRIVATE_BURST = 3
+GROUP_RATE = 20 / 60
+GROUP_BURST = 5
+
+# Per-chat buckets kept in memory; the least recently used one is forgotten past this
+MAX_CHAT_BUCKETS = 10000
+
+# A request hitting 429 is retried after Telegram's retry_after this many times before giving up
+MAX_RETRIES = 3
+
+# Only these endpoints post or change messages in a chat and count against the global limit
+THROTTLED_PREFIXES = ("send", "edit", "forward", "copy")
+
+# Of those, only new messages count against the chat's limit (edits are limited separately by
+# Telegram, so summon animations and auction caption edits do not use up a group's 20/min)
+CHAT_THROTTLED_PREFIXES = ("send", "forward", "copy")
+
+ENDPOINT_PRIORITY = {
+    "forwardMessage": PRIORITY_LOW,
+    "forwardMessages": PRIORITY_LOW,
+    "copyMessage": PRIORITY_LOW,
+    "copyMessages": PRIORITY_LOW,
+    "editMessageText": PRIORITY_LOW,
+    "editMessageCaption": PRIORITY_LOW,
+    "editMessageMedia": PRIORITY_LOW,
+    "editMessageReplyMarkup": PRIORITY_LOW,
+}
+
+PRIORITY_NAMES = {PRIORITY_HIGH: "high", PRIORITY_NORMAL: "normal", PRIORITY_LOW: "low"}
+
+
+class TokenBucket:
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate, capacity, now):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now):
+        """Seconds until a token is available, without taking it."""
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+    def pause(self, seconds, now):
+        """Blocks the bucket for `seconds` (used when Telegram answers 429)."""
+        self._refill(now)
+        self.tokens = min(self.tokens, 1 - seconds * self.rate)
+
+
+class ChatLane:
+    """A chat's send bucket and the requests parked until it refills."""
+
+    __slots__ = ("bucket", "parked", "scheduled")
+
+    def __init__(self, bucket):
+        self.bucket = bucket
+        self.parked = []        # heap of waiters that found the bucket empty
+        self.scheduled = False  # whether the lane is on the dispatcher's timer heap
+
+
+class OutboundLimiter(BaseRateLimiter):
+    """Rate limiter for every Bot API request `application.bot` makes.
+
+    Message-sending requests wait in one priority heap; a single dispatcher task hands out
+    tokens, highest priority first, taking the global token and the chat's token at the same
+    moment. A request whose chat bucket is empty is parked on that chat until it refills and
+    then competes again by priority, so a drop in a busy group goes ahead of any normal or low
+    priority send already waiting there. Other requests (answers, getters) pass straight
+    through. A 429 pauses the chat (or the global bucket for requests without a chat) and the
+    request is retried.
+    """
+
+    def __init__(self):
+        self._global = None
+        self._chats = OrderedDict()
+        self._waiters = []  # heap of (priority, seq, future, lane or None)
+        self._timers = []   # heap of (refill time, seq, lane) for lanes with parked waiters
+        self._seq = itertools.count()
+        self._wakeup = None
+        self._dispatcher = None
+        self.sent = {name: 0 for name in PRIORITY_NAMES.values()}
+        self.retries = 0
+        self.failed = 0
+        self.wait_seconds = 0.0
+
+    @property
+    def queued(self):
+        return len(self._waiters)
+
+    @property
+    def chat_wait(self):
+        """Requests parked on their chat's bucket."""
+        return sum(len(lane.parked) for _, _, lane in self._timers)
+
+    def queued_by_priority(self):
+        counts = {name: 0 for name in PRIORITY_NAMES.values()}
+        for priority, _, _, _ in self._waiters:
+            counts[PRIORITY_NAMES[priority]] += 1
+        return counts
+
+    async def initialize(self):
+        self._global = TokenBucket(GLOBAL_RATE, GLOBAL_BURST, time.monotonic())
+        self._wakeup = asyncio.Event()
+        self._dispatcher = asyncio.create_task(self._dispatch())
+
+    async def shutdown(self):
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            await asyncio.gather(self._dispatcher, return_exceptions=True)
+            self._dispatcher = None
+        for _, _, lane in self._timers:
+            for _, _, future, _ in lane.parked:
+                future.cancel()
+            lane.parked.clear()
+        for _, _, future, _ in self._waiters:
+            future.cancel()
+        self._waiters.clear()
+        self._timers.clear()
+
+    def _lane(self, chat_id, now):
+        lane = self._chats.get(chat_id)
+        if lane is None:
+            group = isinstance(chat_id, str) or chat_id < 0  # @username chat ids are channels/groups
+            lane = self._chats[chat_id] = ChatLane(
+                TokenBucket(GROUP_RATE, GROUP_BURST, now) if group else TokenBucket(PRIVATE_RATE, PRIVATE_BURST, now)
+            )
+            # Evicting a lane only forgets its bucket; requests parked on it keep their reference
+            if len(self._chats) > MAX_CHAT_BUCKETS:
+                self._chats.popitem(last=False)
+        else:
+            self._chats.move_to_end(chat_id)
+        return lane
+
+    def _release_timers(self, now):
+        """Moves the parked waiters of every refilled lane back into the priority heap."""
+        while self._timers and self._timers[0][0] <= now:
+            _, _, lane = heapq.heappop(self._timers)
+            lane.scheduled = False
+            for waiter in lane.parked:
+                heapq.heappush(self._waiters, waiter)
+            lane.parked.clear()
+
+    def _park(self, waiter, lane, delay, now):
+        heapq.heappush(lane.parked, waiter)
+        if not lane.scheduled:
+            lane.scheduled = True
+            heapq.heappush(self._timers, (now + delay, next(self._seq), lane))
+
+    async def _dispatch(self):
+        while True:
+            now = time.monotonic()
+            self._release_timers(now)
+            if not self._waiters:
+                self._wakeup.clear()
+                timeout = self._timers[0][0] - now if self._timers else None
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            delay = self._global.wait_time(now)
+            if delay:
+                await asyncio.sleep(delay)
+                continue  # a higher priority request may have arrived meanwhile
+
+            waiter = heapq.heappop(self._waiters)
+            _, _, future, lane = waiter
+            if future.done():
+                continue
+            if lane is not None:
+                chat_delay = lane.bucket.wait_time(now)
+                if chat_delay:
+                    self._park(waiter, lane, chat_delay, now)
+                    continue
+                lane.bucket.take()
+            self._global.take()
+            future.set_result(None)
+
+    async def _acquire(self, lane, priority):
+        start = time.monotonic()
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), future, lane))
+        self._wakeup.set()
+        await future
+        self.wait_seconds += time.monotonic() - start
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        if not endpoint.startswith(THROTTLED_PREFIXES) or self._dispatcher is None:
+            return await callback(*args, **kwargs)
+
+        priority = rate_limit_args if rate_limit_args is not None else ENDPOINT_PRIORITY.get(endpoint, PRIORITY_NORMAL)
+        chat_id = data.get("chat_id")
+        chat_limited = chat_id is not None and endpoint.startswith(CHAT_THROTTLED_PREFIXES)
+
+        for attempt in range(MAX_RETRIES + 1):
+            lane = self._lane(chat_id, time.monotonic()) if chat_limited else None
+            # ✅ A handler waiting for a busy group's budget gives its scheduler slot to other chats
+            async with scheduler.paused():
+                await self._acquire(lane, priority)
+            try:
+                result = await callback(*args, **kwargs)
+            except RetryAfter as e:
+                retry_after = e.retry_after
+                if lane is not None:
+                    lane.bucket.pause(retry_after, time.monotonic())
+                elif chat_id is None:
+                    self._global.pause(retry_after, time.monotonic())
+                if attempt == MAX_RETRIES:
+                    self.failed += 1
+                    raise
+                self.retries += 1
+                LOGGER.warning("Flood wait %ss on %s in %s, retrying", retry_after, endpoint, chat_id)
+                if lane is None and chat_id is not None:
+                    await scheduler.sleep(retry_after)  # an edit: wait out this chat only
+                continue
+            self.sent[PRIORITY_NAMES[priority]] += 1
+            return result
@@ -0,0 +1,311 @@
+import asyncio
+from collections import Counter
+from datetime import datetime, timezone
+
+from pymongo import DESCENDING, UpdateOne
+
+from shivu import db, user_collection, LOGGER
+from shivu.catalog import catalog
+
+# Users own characters as a map on their document:
+#     owned: {"<character id>": {"count": 2, "first_at": <date>, "last_at": <date>}}
+#     owned_total: 2
+# Character details are resolved against the catalog when read. Documents written before this
+# still carry the legacy `characters` array of full catalog documents; they are converted on
+# first read and by the background migration below, and the read helpers understand both.
+
+# Progress of the background migration is checkpointed here so it resumes after a restart
+migrations_collection = db['migrations']
+MIGRATION_ID = "ownership_map"
+MIGRATION_BATCH = 200
+MIGRATION_PAUSE = 1  # seconds between batches, to keep the migration off the hot path
+MIGRATION_RETRIES = 3  # re-reads of a user whose array changed between the read and the conversion
+
+# Set once no user document has a legacy `characters` array left
+migration_done = False
+
+_migrating = set()  # user _ids being converted right now
+_migration_tasks = set()  # strong references, so background conversions are not garbage collected
+
+
+def grant_update(character_ids, update=None, now=None):
+    """Adds the grant of `character_ids` (repeats allowed) to a Mongo update document."""
+    update = update if update is not None else {}
+    now = now or datetime.now(timezone.utc)
+    inc = update.setdefault('$inc', {})
+    first = update.setdefault('$min', {})
+    last = update.setdefault('$max', {})
+    counts = Counter(character_ids)
+    for character_id, count in counts.items():
+        inc[f'owned.{character_id}.count'] = inc.get(f'owned.{character_id}.count', 0) + count
+        first[f'owned.{character_id}.first_at'] = now
+        last[f'owned.{character_id}.last_at'] = now
+    inc['owned_total'] = inc.get('owned_total', 0) + sum(counts.values())
+    return update
+
+
+async def grant_characters(user_id, character_ids, update=None, upsert=False):
+    """Grants characters to a user in one update; `update` may carry other changes (coins, ...)."""
+    return await user_collection.update_one({'id': user_id}, grant_update(character_ids, update), upsert=upsert)
+
+
+def owned_counts(user):
+    """character id -> count for a user document, old or new format."""
+    counts = {
+        character_id: entry['count']
+        for character_id, entry in (user.get('owned') or {}).items()
+        if entry.get('count', 0) > 0
+    }
+    for character in user.get('characters') or ():
+        character_id = character.get('id')
+        if character_id:
+            counts[character_id] = counts.get(character_id, 0) + 1
+    return counts
+
+
+def owned_total(user):
+    if user.get('characters'):
+        return sum(owned_counts(user).values())
+    return user.get('owned_total', 0)
+
+
+def resolve(character_id, user=None):
+    """Catalog document for an owned id (falls back to a legacy embedded copy if the catalog lost it)."""
+    character = catalog.get(character_id)
+    if character is None and user is not None:
+        character = next((c for c in user.get('characters') or () if c.get('id') == character_id), None)
+    return character
+
+
+async def owned_characters(user):
+    """[(character document, count)] for everything the user owns, in catalog id order."""
+    await catalog.ensure_fresh()
+    result = []
+    for character_id, count in sorted(owned_counts(user).items()):
+        character = resolve(character_id, user)
+        if character is not None:
+            result.append((character, count))
+    return result
+
+
+async def load_user(user_id, projection=None):
+    """Reads a user document; old-format documents are converted in the background."""
+    if projection is not None:
+        projection = {**projection, 'owned': 1, 'owned_total': 1, 'characters': 1}
+    user = await user_collection.find_one({'id': user_id}, projection)
+    if user is not None and 'characters' in user and user['_id'] not in _migrating:
+        task = asyncio.ensure_future(migrate_user(user))
+        _migration_tasks.add(task)
+        task.add_done_callback(_migration_tasks.discard)
+    return user
+
+
+def migration_update(user, now=None):
+    """Update that folds a legacy `characters` array into `owned` (acquisition time unknown: now)."""
+    ids = [c['id'] for c in user.get('characters') or () if c.get('id')]
+    update = grant_update(ids, now=now) if ids else {}
+    update['$unset'] = {'characters': ""}
+    return update
+
+
+def migration_filter(user):
+    """Matches the user only while `characters` is still the array that was read.
+
+    Grants no longer touch the array, but deleting a character $pulls from it, which the
+    size gives away.
+    """
+    return {'_id': user['_id'], 'characters': {'$size': len(user.get('characters') or ())}}
+
+
+async def migrate_user(user):
+    """Converts one user document; a no-op if something else converted it first."""
+    user_id = user['_id']
+    if 'characters' not in user or user_id in _migrating:
+        return False
+    _migrating.add(user_id)
+    try:
+        for _ in range(MIGRATION_RETRIES):
+            result = await user_collection.update_one(migration_filter(user), migration_update(user))
+            if result.matched_count:
+                return bool(result.modified_count)
+            # ✅ Converted elsewhere, or a character was removed since the read: read it again
+            user = await user_collection.find_one({'_id': user_id, 'characters': {'$exists': True}}, {'characters': 1})
+            if user is None:
+                return False
+        return False
+    except Exception as e:
+        LOGGER.warning("Could not migrate ownership of %s: %s", user_id, e)
+        return False
+    finally:
+        _migrating.discard(user_id)
+
+
+async def ensure_migrated(user_id):
+    """Converts the user's document now if needed (before conditional updates on `owned`)."""
+    user = await user_collection.find_one({'id': user_id, 'characters': {'$exists': True}}, {'characters': 1})
+    if user is not None:
+        await migrate_user(user)
+
+
+async def take_character(user_id, character_id, count=1):
+    """Removes `count` copies if the user has them; returns False (and changes nothing) otherwise."""
+    await ensure_migrated(user_id)
+    result = await user_collection.update_one(
+        {'id': user_id, f'owned.{character_id}.count': {'$gte': count}},
+        {'$inc': {f'owned.{character_id}.count': -count, 'owned_total': -count}}
+    )
+    if not result.modified_count:
+        return False
+    await user_collection.update_one(
+        {'id': user_id, f'owned.{character_id}.count': {'$lte': 0}},
+        {'$unset': {f'owned.{character_id}': ""}}
+    )
+    return True
+
+
+async def remove_everywhere(character_id):
+    """Drops a deleted catalog character from every user, keeping owned_total right."""
+    path = f'owned.{character_id}'
+    await user_collection.update_many(
+        {f'{path}.count': {'$exists': True}},
+        [
+            {'$set': {'owned_total': {'$subtract': [{'$ifNull': ['$owned_total', 0]}, {'$ifNull': [f'${path}.count', 0]}]}}},
+            {'$unset': path},
+        ]
+    )
+    if not migration_done:
+        await user_collection.update_many({'characters.id': character_id}, {'$pull': {'characters': {'id': character_id}}})
+
+
+async def count_owners(character_id):
+    """Number of users owning at least one copy of a character."""
+    query = {f'owned.{character_id}.count': {'$gt': 0}}
+    if not migration_done:
+        query = {'$or': [query, {'characters.id': character_id}]}
+    return await user_collection.count_documents(query)
+
+
+async def top_owners(character_id, limit):
+    """[{'_id': user id, 'first_name', 'count'}] of the users owning the most copies of a character."""
+    path = f'owned.{character_id}.count'
+    cursor = user_collection.find(
+        {path: {'$gt': 0}}, {'id': 1, 'first_name': 1, path: 1}
+    ).sort(path, DESCENDING).limit(limit)
+    owners = {
+        user['id']: {'_id': user['id'], 'first_name': user.get('first_name', 'Unknown'), 'count': user['owned'][character_id]['count']}
+        for user in await cursor.to_list(length=limit)
+    }
+
+    if not migration_done:
+        legacy = await user_collection.aggregate([
+            {"$match": {"characters.id": character_id}},
+            {"$project": {"id": 1, "first_name": 1, "count": {"$size": {"$filter": {
+                "input": "$characters", "cond": {"$eq": ["$$this.id", character_id]}
+            }}}}},
+            {"$sort": {"count": -1}},
+            {"$limit": limit}
+        ]).to_list(length=limit)
+        for user in legacy:
+            entry = owners.setdefault(user['id'], {'_id': user['id'], 'first_name': user.get('first_name', 'Unknown'), 'count': 0})
+            entry['count'] += user['count']
+
+    return sorted(owners.values(), key=lambda entry: entry['count'], reverse=True)[:limit]
+
+
+async def top_collectors(limit):
+    """[{'username', 'first_name', 'character_count'}] of the users owning the most characters."""
+    if migration_done:
+        cursor = user_collection.find({}, {'username': 1, 'first_name': 1, 'owned_total': 1}).sort('owned_total', DESCENDING).limit(limit)
+        return [
+            {**user, 'character_count': user.get('owned_total', 0)}
+            for user in await cursor.to_list(length=limit)
+        ]
+    return await user_collection.aggregate([
+        {"$project": {"username": 1, "first_name": 1, "character_count": {"$add": [
+            {"$ifNull": ["$owned_total", 0]},
+            {"$size": {"$ifNull": ["$characters", []]}}
+        ]}}},
+        {"$sort": {"character_count": -1}},
+        {"$limit": limit}
+    ]).to_list(length=limit)
+
+
+class OwnershipMigration:
+    """Background, resumable conversion of every legacy user document, in `_id` order."""
+
+    def __init__(self, batch=MIGRATION_BATCH, pause=MIGRATION_PAUSE):
+        self.batch = batch
+        self.pause = pause
+        self.migrated = 0
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def run(self):
+        global migration_done
+        checkpoint = await migrations_collection.find_one({'_id': MIGRATION_ID}) or {}
+        if checkpoint.get('done'):
+            migration_done = True
+            return
+
+        self.migrated = checkpoint.get('migrated', 0)
+        LOGGER.info("Ownership migration resuming after %s (%d users converted so far)", checkpoint.get('last_id'), self.migrated)
+        await self._pass(checkpoint.get('last_id'))
+
+        # ✅ A user may have been skipped while it was being converted lazily: one more pass from the start
+        if await user_collection.count_documents({'characters': {'$exists': True}}, limit=1):
+            await self._pass(None)
+            if await user_collection.count_documents({'characters': {'$exists': True}}, limit=1):
+                LOGGER.warning("Ownership migration left some users unconverted; it will retry on the next start")
+                await migrations_collection.update_one({'_id': MIGRATION_ID}, {'$set': {'last_id': None}}, upsert=True)
+                return
+
+        await migrations_collection.update_one(
+            {'_id': MIGRATION_ID},
+            {'$set': {'done': True, 'migrated': self.migrated, 'updated_at': datetime.now(timezone.utc)}},
+            upsert=True
+        )
+        migration_done = True
+        LOGGER.info("Ownership migration complete: %d users converted", self.migrated)
+
+    async def _pass(self, last_id):
+        while True:
+            query = {'characters': {'$exists': True}}
+            if last_id is not None:
+                query['_id'] = {'$gt': last_id}
+            users = await user_collection.find(query, {'characters': 1}).sort('_id', 1).limit(self.batch).to_list(length=self.batch)
+            if not users:
+                break
+
+            now = datetime.now(timezone.utc)
+            batch = [user for user in users if user['_id'] not in _migrating]
+            operations = [UpdateOne(migration_filter(user), migration_update(user, now)) for user in batch]
+            if operations:
+                result = await user_collection.bulk_write(operations, ordered=False)
+                self.migrated += result.modified_count
+                if result.matched_count < len(operations):
+                    # ✅ Arrays that changed since the read are converted one by one from a fresh read
+                    changed = await user_collection.find(
+                        {'_id': {'$in': [user['_id'] for user in batch]}, 'characters': {'$exists': True}},
+                        {'characters': 1}
+                    ).to_list(length=None)
+                    for user in changed:
+                        self.migrated += await migrate_user(user)
+
+            last_id = users[-1]['_id']
+            await migrations_collection.update_one(
+                {'_id': MIGRATION_ID},
+                {'$set': {'last_id': last_id, 'migrated': self.migrated, 'updated_at': now}},
+                upsert=True
+            )
+            await asyncio.sleep(self.pause)
+
+
+ownership_migration = OwnershipMigration()
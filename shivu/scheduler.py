@@ -0,0 +1,166 @@
+import asyncio
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+
+from telegram import Update
+
+# Handler bodies allowed to run at once across all users; the rest wait for a slot
+MAX_CONCURRENT_HANDLERS = 64
+
+# Updates one user may have queued or running in serialized handlers; more are dropped
+MAX_PENDING_PER_USER = 5
+
+# Updates allowed to wait while every slot is taken; past this new updates are dropped
+MAX_WAITING_HANDLERS = 1000
+
+
+def read_only(callback):
+    """Marks a handler that never changes user state, so it skips per-user serialization."""
+    callback.__read_only__ = True
+    return callback
+
+
+def unscheduled(callback):
+    """Marks a handler that must run immediately, e.g. a guard in a blocking handler group."""
+    callback.__unscheduled__ = True
+    return callback
+
+
+class SlotHold:
+    """The slot a handler task runs under, so the handler can give it back while it only waits."""
+
+    __slots__ = ("task", "held")
+
+    def __init__(self):
+        self.task = asyncio.current_task()
+        self.held = False
+
+
+_hold = ContextVar("scheduler_hold", default=None)
+
+
+class UserLane:
+    """FIFO of one user's serialized handlers (asyncio.Lock wakes waiters in arrival order)."""
+
+    __slots__ = ("lock", "pending")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.pending = 0  # queued + running; the lane is dropped when it reaches 0
+
+
+class HandlerScheduler:
+    """Runs handlers under a global concurrency cap, one at a time per user.
+
+    PTB starts a task per update for `block=False` handlers; this decides when each task's
+    handler body may run. Handlers that change user state run in arrival order per user (so
+    two /deposit calls cannot both pass the balance check) and each user may only have
+    MAX_PENDING_PER_USER of them outstanding. Read-only handlers only take a global slot.
+    A handler that waits on something other than work (a sleep, a rate-limited send) should
+    do it inside `paused()` so its slot serves other updates meanwhile.
+    """
+
+    def __init__(self, max_concurrent=MAX_CONCURRENT_HANDLERS, max_pending=MAX_PENDING_PER_USER,
+                 max_waiting=MAX_WAITING_HANDLERS):
+        self.max_concurrent = max_concurrent
+        self.max_pending = max_pending
+        self.max_waiting = max_waiting
+        self._slots = asyncio.Semaphore(max_concurrent)
+        self._lanes = {}  # user_id -> UserLane, only while the user has pending updates
+        self.running = 0
+        self.waiting = 0
+        self.rejected = 0
+        self.shed = 0
+
+    @property
+    def lanes(self):
+        return len(self._lanes)
+
+    async def _take_slot(self):
+        self.waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+        self.running += 1
+
+    def _give_slot(self):
+        self.running -= 1
+        self._slots.release()
+
+    @asynccontextmanager
+    async def slot(self, update, read_only=False):
+        """Waits for the update's turn; yields False (without waiting) if the user's lane is full
+        or too many updates are already waiting for a slot."""
+        if self.waiting >= self.max_waiting and self._slots.locked():
+            self.shed += 1
+            yield False
+            return
+
+        user = None if read_only or not isinstance(update, Update) else update.effective_user
+        lane = None
+        if user is not None:
+            lane = self._lanes.get(user.id)
+            if lane is None:
+                lane = self._lanes[user.id] = UserLane()
+            elif lane.pending >= self.max_pending:
+                self.rejected += 1
+                yield False
+                return
+            lane.pending += 1
+
+        hold = SlotHold()
+        try:
+            if lane is not None:
+                self.waiting += 1
+                try:
+                    await lane.lock.acquire()
+                finally:
+                    self.waiting -= 1
+            try:
+                await self._take_slot()
+                hold.held = True
+                token = _hold.set(hold)
+                try:
+                    yield True
+                finally:
+                    _hold.reset(token)
+                    if hold.held:
+                        hold.held = False
+                        self._give_slot()
+            finally:
+                if lane is not None:
+                    lane.lock.release()
+        finally:
+            if lane is not None:
+                lane.pending -= 1
+                if not lane.pending:
+                    del self._lanes[user.id]
+
+    @asynccontextmanager
+    async def paused(self):
+        """Gives the running handler's global slot back for the duration of the block.
+
+        The user's lane stays held, so the user's next serialized update still waits. Outside a
+        scheduled handler (or in a task it spawned) this does nothing.
+        """
+        hold = _hold.get()
+        if hold is None or not hold.held or hold.task is not asyncio.current_task():
+            yield
+            return
+
+        hold.held = False
+        self._give_slot()
+        try:
+            yield
+        finally:
+            await self._take_slot()
+            hold.held = True
+
+    async def sleep(self, seconds):
+        """`asyncio.sleep` that frees the handler's slot meanwhile (animations, suspense delays)."""
+        async with self.paused():
+            await asyncio.sleep(seconds)
+
+
+scheduler = HandlerScheduler()
@@ -0,0 +1,124 @@
+import math
+import time
+from collections import OrderedDict
+
+from telegram import Update
+from telegram.ext import ApplicationHandlerStop, CallbackContext
+
+from shivu import COMMAND_LIMITS, OWNER_ID, sudo_users
+from shivu.scheduler import unscheduled
+
+# Commands that load a user's whole collection or a leaderboard
+HEAVY_COMMANDS = frozenset({
+    "harem", "collection", "powerlevel", "profile", "check", "characters", "srarity",
+    "top", "ctop", "topgroups", "stats", "wtop", "list", "groups",
+})
+GUESS_COMMANDS = frozenset({"guess", "protecc", "collect", "grab", "hunt"})
+
+# Callback data prefixes of the heavy commands' pagination buttons
+HEAVY_CALLBACKS = ("harem", "sort:", "characters:", "rarity:", "show_top_collectors:", "show_local_collectors:")
+
+# (user, class) buckets kept in memory; the least recently active is evicted past this
+MAX_TRACKED = 50000
+
+EXEMPT_USERS = frozenset({int(OWNER_ID), *sudo_users})
+
+
+class UserBucket:
+    __slots__ = ("tokens", "updated", "warned")
+
+    def __init__(self, tokens, now):
+        self.tokens = tokens
+        self.updated = now
+        self.warned = False
+
+
+def command_class(update):
+    """Limit class of an update, or None if it is not limited (plain messages, joins, ...)."""
+    if update.inline_query is not None:
+        return "inline"
+    if update.callback_query is not None:
+        data = update.callback_query.data or ""
+        return "heavy" if data.startswith(HEAVY_CALLBACKS) else "default"
+
+    message = update.message
+    text = message.text if message is not None else None
+    if not text or not text.startswith("/"):
+        return None
+    command = text[1:].split(maxsplit=1)[0].split("@", 1)[0].lower() if len(text) > 1 else ""
+    if command in HEAVY_COMMANDS:
+        return "heavy"
+    if command in GUESS_COMMANDS:
+        return "guess"
+    return "default"
+
+
+class CommandLimiter:
+    """Per-user, per-class token buckets in one LRU-bounded map; every check is O(1)."""
+
+    def __init__(self, limits=COMMAND_LIMITS, maxsize=MAX_TRACKED):
+        # class -> (burst, tokens refilled per second)
+        self.limits = {name: (burst, burst / seconds) for name, (burst, seconds) in limits.items()}
+        self.maxsize = maxsize
+        self._buckets = OrderedDict()
+        self.allowed = dict.fromkeys(self.limits, 0)
+        self.rejected = dict.fromkeys(self.limits, 0)
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def check(self, user_id, limit_class, now):
+        """Takes a token. Returns None if allowed, else seconds until the next token (and whether to warn)."""
+        burst, rate = self.limits[limit_class]
+        key = (user_id, limit_class)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = UserBucket(burst, now)
+            if len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+            bucket.tokens = min(burst, bucket.tokens + (now - bucket.updated) * rate)
+            bucket.updated = now
+
+        if bucket.tokens >= 1:
+            bucket.tokens -= 1
+            bucket.warned = False
+            self.allowed[limit_class] += 1
+            return None
+
+        self.rejected[limit_class] += 1
+        warn = not bucket.warned
+        bucket.warned = True
+        return (1 - bucket.tokens) / rate, warn
+
+
+command_limiter = CommandLimiter()
+
+
+@unscheduled
+async def spam_guard(update: Update, context: CallbackContext) -> None:
+    """Runs in handler group -1 and stops the update before any command handler sees it."""
+    user = update.effective_user
+    if user is None or user.id in EXEMPT_USERS:
+        return
+    limit_class = command_class(update)
+    if limit_class is None:
+        return
+
+    limited = command_limiter.check(user.id, limit_class, time.monotonic())
+    if limited is None:
+        return
+
+    retry_in, warn = limited
+    retry_in = math.ceil(retry_in)
+    if update.callback_query is not None:
+        # ✅ Always answer, or the button keeps spinning
+        await update.callback_query.answer(f"⏳ Slow down! Try again in {retry_in}s.")
+    elif warn and update.message is not None:
+        # ✅ Not awaited: the reply waits for the chat's send budget, and this guard runs inline
+        # in the update fetcher
+        context.application.create_task(
+            update.message.reply_text(f"⏳ Slow down! Try again in {retry_in}s."), update=update
+        )
+    raise ApplicationHandlerStop
@@ -0,0 +1,133 @@
+from typing import NamedTuple
+
+# Rarities and categories are stored (in the catalog, banners and indexes) as the small integer
+# codes below and turned into their emoji labels only when a message is rendered. The codes are
+# the numbers admins already type in /upload and /update, so they must never be renumbered.
+
+
+class Rarity(NamedTuple):
+    code: int
+    emoji: str
+    name: str
+    power: int           # /powerlevel points per copy, also ranks rarities ("rarest pull")
+    summon_rate: float   # relative weight of a banner summon
+    droppable: bool      # whether it can drop in groups
+
+    @property
+    def label(self):
+        return f"{self.emoji} {self.name}"
+
+
+class Category(NamedTuple):
+    code: int
+    emoji: str
+    name: str
+
+    @property
+    def label(self):
+        return f"{self.emoji} {self.name}"
+
+
+COMMON, RARE, EXTREME, SPARKING, LIMITED_EDITION, ULTIMATE, CELESTIAL, SUPREME = range(1, 9)
+
+RARITIES = {r.code: r for r in (
+    Rarity(COMMON, "⛔", "Common", 100, 40, True),
+    Rarity(RARE, "🍀", "Rare", 300, 25, True),
+    Rarity(EXTREME, "🟣", "Extreme", 800, 15, True),
+    Rarity(SPARKING, "🟡", "Sparking", 1500, 10, True),
+    Rarity(LIMITED_EDITION, "🔮", "Limited Edition", 6000, 4, False),
+    Rarity(ULTIMATE, "🔱", "Ultimate", 2500, 3, False),
+    Rarity(CELESTIAL, "⛩️", "Celestial", 10000, 2, False),
+    Rarity(SUPREME, "👑", "Supreme", 4000, 1, False),
+)}
+
+CATEGORIES = {c.code: c for c in (
+    Category(1, "🏆", "Saiyan"),
+    Category(2, "🔥", "Hybrid Saiyan"),
+    Category(3, "🤖", "Android"),
+    Category(4, "❄️", "Frieza Force"),
+    Category(5, "✨", "God Ki"),
+    Category(6, "💪", "Super Warrior"),
+    Category(7, "🩸", "Regeneration"),
+    Category(8, "🔀", "Fusion Warrior"),
+    Category(9, "🤝", "Duo"),
+    Category(10, "🔱", "Super Saiyan God SS"),
+    Category(11, "🗿", "Ultra Instinct Sign"),
+    Category(12, "⚡", "Super Saiyan"),
+    Category(13, "❤️‍🔥", "Dragon Ball Saga"),
+    Category(14, "💫", "Majin Buu Saga"),
+    Category(15, "👾", "Cell Saga"),
+    Category(16, "📽️", "Sagas From the Movies"),
+    Category(17, "☠️", "Lineage Of Evil"),
+    Category(18, "🌏", "Universe Survival Saga"),
+)}
+
+# Labels and names as they were stored before the codes (and as admins may type them)
+_RARITY_LOOKUP = {key: r for r in RARITIES.values() for key in (r.label, r.name.lower())}
+_CATEGORY_LOOKUP = {key: c for c in CATEGORIES.values() for key in (c.label, c.name.lower())}
+
+
+def _find(value, registry, lookup):
+    if isinstance(value, int):
+        return registry.get(value)
+    if isinstance(value, str):
+        value = value.strip()
+        if value.isdigit():
+            return registry.get(int(value))
+        return lookup.get(value) or lookup.get(value.lower())
+    return None
+
+
+def get_rarity(value):
+    """Rarity for a code, a typed number ("4"), a stored label or a name; None if unknown."""
+    return _find(value, RARITIES, _RARITY_LOOKUP)
+
+
+def get_category(value):
+    """Category for a code, a typed number, a stored label or a name; None if unknown."""
+    return _find(value, CATEGORIES, _CATEGORY_LOOKUP)
+
+
+def rarity_code(value):
+    """Code to store for a rarity; values that are not in the registry are kept as they are."""
+    rarity = get_rarity(value)
+    return rarity.code if rarity else value
+
+
+def category_code(value):
+    category = get_category(value)
+    return category.code if category else value
+
+
+def rarity_label(value, default="❓ Unknown"):
+    rarity = get_rarity(value)
+    if rarity:
+        return rarity.label
+    return value if isinstance(value, str) and value else default
+
+
+def category_label(value, default="❓ Unknown"):
+    category = get_category(value)
+    if category:
+        return category.label
+    return value if isinstance(value, str) and value else default
+
+
+def rarity_emoji(value, default="🔹"):
+    rarity = get_rarity(value)
+    return rarity.emoji if rarity else default
+
+
+def rarity_power(value, default=100):
+    rarity = get_rarity(value)
+    return rarity.power if rarity else default
+
+
+def summon_rate(value, default=1):
+    rarity = get_rarity(value)
+    return rarity.summon_rate if rarity else default
+
+
+def is_droppable(value):
+    rarity = get_rarity(value)
+    return rarity.droppable if rarity else True
@@ -0,0 +1,90 @@
+"""Webhook ingestion: Telegram POSTs updates to the health server instead of us long polling.
+
+Run this file directly to act as a fake Telegram sender against a local bot:
+
+    python shivu/webhook.py --url http://localhost:8000/webhook --secret <secret> --chat -100123 --text "/guess goku"
+"""
+import argparse
+import asyncio
+import hmac
+import random
+import time
+
+from aiohttp import ClientSession, web
+from telegram import Update
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class WebhookReceiver:
+    """aiohttp handler that verifies Telegram's secret token and feeds the bot's update queue.
+
+    The update queue is bounded; when it is full the request gets a 503 so Telegram retries
+    it later instead of the bot buffering without limit.
+    """
+
+    def __init__(self, application, secret):
+        if not secret:
+            raise ValueError("WebhookReceiver needs a secret token; unauthenticated updates could impersonate any user")
+        self.application = application
+        self.secret = secret
+        self.received = 0
+        self.rejected = 0
+        self.overflowed = 0
+
+    async def handle(self, request):
+        if not hmac.compare_digest(request.headers.get(SECRET_HEADER, "").encode(), self.secret.encode()):
+            self.rejected += 1
+            return web.Response(status=403)
+
+        try:
+            data = await request.json()
+            if not isinstance(data, dict):
+                raise ValueError("update is not a JSON object")
+            update = Update.de_json(data, self.application.bot)
+        except (ValueError, TypeError, KeyError, AttributeError):
+            self.rejected += 1
+            return web.Response(status=400)
+
+        try:
+            self.application.update_queue.put_nowait(update)
+        except asyncio.QueueFull:
+            self.overflowed += 1
+            return web.Response(status=503)
+
+        self.received += 1
+        return web.Response()
+
+
+def fake_update(chat_id, user_id, text, update_id=None):
+    """Builds a minimal Telegram message update, as Telegram would POST it."""
+    message = {
+        "message_id": random.randint(1, 2 ** 31),
+        "date": int(time.time()),
+        "chat": {"id": chat_id, "type": "supergroup" if chat_id < 0 else "private", "title": "Test Group"},
+        "from": {"id": user_id, "is_bot": False, "first_name": "Tester", "username": "tester"},
+        "text": text,
+    }
+    if text.startswith("/"):
+        message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+    return {"update_id": update_id or random.randint(1, 2 ** 31), "message": message}
+
+
+async def send_fake_updates(url, secret, chat_id, user_id, text, count):
+    headers = {SECRET_HEADER: secret} if secret else {}
+    async with ClientSession() as session:
+        for _ in range(count):
+            async with session.post(url, json=fake_update(chat_id, user_id, text), headers=headers) as response:
+                print(response.status, await response.text())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake Telegram sender for webhook mode")
+    parser.add_argument("--url", default="http://localhost:8000/webhook")
+    parser.add_argument("--secret", default="")
+    parser.add_argument("--chat", type=int, default=-100123456789)
+    parser.add_argument("--user", type=int, default=123456789)
+    parser.add_argument("--text", default="hello")
+    parser.add_argument("--count", type=int, default=1)
+    args = parser.parse_args()
+    asyncio.run(send_fake_updates(args.url, args.secret, args.chat, args.user, args.text, args.count))